@@ -0,0 +1,128 @@
+import json
+import random
+
+# 合成的 UR 数据集与页面模板：结构、class 名与真实页面中扫描器依赖的部分保持一致
+
+AREA_PREFIX = {"tokyo": "20", "kanagawa": "40", "chiba": "30"}
+RESULT_PAGE_SIZE = 10
+ROOM_API_PATH = "/chintai/api/bukken/detail/detail_bukken_room/"
+
+def build_dataset(areas, danchi_per_area=30, max_rooms=4, seed=42):
+    """生成 {area: [团地]}；部分团地没有空房，部分房间页不带坐标 (需要走地图页)"""
+    rng = random.Random(seed)
+    data = {}
+    for area in areas:
+        prefix = AREA_PREFIX.get(area, "90")
+        danchi_list = []
+        for i in range(danchi_per_area):
+            did = f"{prefix}_{1000 + i * 10:04d}"
+            rooms = []
+            for r in range(rng.randint(0, max_rooms)):
+                size = rng.choice([42.5, 55.1, 61.0, 70.3])
+                rooms.append({
+                    "jkss": f"{int(prefix) * 10**7 + i * 100 + r:09d}",
+                    "no": f"{rng.randint(1, 12)}号棟{rng.randint(1, 9)}0{r + 1}号室",
+                    "price": rng.randrange(60000, 150000, 100),
+                    "fee": rng.choice([2500, 3000, 3500]),
+                    "layout": rng.choice(["1LDK", "2DK", "2LDK", "3DK"]),
+                    "size": size,
+                    "floor": f"{rng.randint(1, 14)}階",
+                    "years": f"{rng.randint(1965, 2005)}年",
+                })
+            danchi_list.append({
+                "area": area,
+                "id": did,
+                "name": f"ベンチ{area}{i:02d}団地",
+                "lat": round(35.3 + rng.random() * 0.6, 6),
+                "lng": round(139.3 + rng.random() * 0.8, 6),
+                "coords_on_page": rng.random() < 0.7,
+                "rooms": rooms,
+            })
+        data[area] = danchi_list
+    return data
+
+def room_url(d, room):
+    return f"/chintai/kanto/{d['area']}/{d['id']}_room.html?JKSS={room['jkss']}"
+
+def danchi_url(d):
+    return f"/chintai/kanto/{d['area']}/{d['id']}.html"
+
+def _page(body, title="UR"):
+    return f"<!DOCTYPE html><html lang='ja'><head><meta charset='utf-8'><title>{title}</title></head><body>{body}</body></html>"
+
+def _coords(d):
+    return (f"<input type='hidden' class='js-lat-data' value='{d['lat']}'>"
+            f"<input type='hidden' class='js-lng-data' value='{d['lng']}'>")
+
+def area_page(area):
+    boxes = "".join(f"<label><input type='checkbox' name='skcs' value='{i}'>区域{i}</label>" for i in range(12))
+    return _page(f"<form>{boxes}</form>")
+
+def result_page(area, danchi_list, page):
+    total = max(1, -(-len(danchi_list) // RESULT_PAGE_SIZE))
+    chunk = danchi_list[(page - 1) * RESULT_PAGE_SIZE:page * RESULT_PAGE_SIZE]
+    items = []
+    for d in chunk:
+        rows = "".join(
+            f"<tr class='js-log-item'><td>{r['no']}</td><td>{r['layout']}</td><td>{r['price']:,}円</td>"
+            f"<td><a href='{room_url(d, r)}'>部屋詳細</a></td></tr>"
+            for r in d["rooms"])
+        items.append(f"<div class='item'><a class='rep_bukken-link' href='{danchi_url(d)}'>{d['name']}</a>"
+                     f"<table><tbody>{rows}</tbody></table></div>")
+    pager = "".join(f"<li class='active'><span>{n}</span></li>" if n == page else f"<li><a href='?page={n}'>{n}</a></li>"
+                    for n in range(1, total + 1))
+    if page < total:
+        pager += f"<li class='next'><a href='?page={page + 1}'>次へ</a></li>"
+    return _page("".join(items) + f"<ul class='pagination'>{pager}</ul>", f"{area} result {page}")
+
+def room_page(d, room):
+    body = (f"<div class='item_subtitle'>{d['name']} ({d['area']})<br>第{room['no'][0]}期</div>"
+            f"<h2 class='item_title rep_room-nm'>{room['no']}</h2>"
+            f"<ul><li class='roomprice'><span class='roomprice_body_emphasis'>{room['price']:,}円</span>"
+            f" ({room['fee']:,}円)</li></ul>"
+            f"<p class='rep_madori-yuka'>{room['layout']} / {room['size']}㎡</p>"
+            f"<p class='rep_kai'>{room['floor']}</p><p class='rep_years'>{room['years']}</p>")
+    if d["coords_on_page"]:
+        body += _coords(d)
+    return _page(body, room["no"])
+
+def map_page(d):
+    return _page(f"<div id='map'></div>{_coords(d)}", f"{d['name']} map")
+
+def danchi_page(d):
+    rooms = d["rooms"]
+    if rooms:
+        prices = sorted(r["price"] for r in rooms)
+        sizes = sorted(r["size"] for r in rooms)
+        layouts = sorted({r["layout"] for r in rooms})
+        rent = f"{prices[0]:,}円～{prices[-1]:,}円<br>({rooms[0]['fee']:,}円)"
+        layout = f"{layouts[0]}～{layouts[-1]} / {sizes[0]}㎡～{sizes[-1]}㎡"
+    else:
+        rent, layout = "-", "-"
+    # 房间表由页面脚本请求房间接口后填充，与真实页面一样需要 JS 渲染
+    script = f"""<script>
+    fetch("{ROOM_API_PATH}", {{method: "POST", headers: {{"Content-Type": "application/x-www-form-urlencoded"}},
+        body: "danchi={d['id']}&area={d['area']}"}})
+      .then(r => r.json()).then(rooms => {{
+        const tbody = document.querySelector("tbody.rep_room");
+        if (!rooms.length) {{
+          document.body.insertAdjacentHTML("beforeend", "<div class='item_no-data'>ご案内できるお部屋がございません</div>");
+          return;
+        }}
+        tbody.innerHTML = rooms.map(r => "<tr class='js-log-item'><td>" + r.name + "</td><td>" + r.rent + "</td></tr>" +
+          "<tr class='js-log-item'><td colspan='2'><a href='" + r.roomDetailLink + "'>部屋詳細</a></td></tr>").join("");
+      }});
+    </script>"""
+    body = (f"<h1 class='article_headings'><ruby><span>{d['name']}</span><rt>べんち</rt></ruby></h1>"
+            f"<div class='article_sliders_table'><table>"
+            f"<tr><th>家賃(共益費)</th><td>{rent}</td></tr>"
+            f"<tr><th>間取り/床面積</th><td>{layout}</td></tr></table></div>"
+            f"<table><tbody class='rep_room'></tbody></table>")
+    if d["coords_on_page"]:
+        body += _coords(d)
+    return _page(body + script, d["name"])
+
+def room_api(d):
+    return json.dumps([
+        {"name": r["no"], "rent": f"{r['price']:,}円", "roomDetailLink": room_url(d, r)} for r in d["rooms"]
+    ], ensure_ascii=False)
@@ -0,0 +1,232 @@
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+import fixtures
+import stub_servers
+
+# resource 只在类 Unix 系统上可用，用于没有 /proc 时回退统计内存峰值
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 用法: python bench/run_bench.py [脚本名 ...]
+# 在本地 UR 桩服务器与假 Notion 上运行各爬虫，不访问真实网站。不带参数时按 RUNS 顺序全部运行，
+# kanto 会跑两遍 (冷启动 + 热启动，后者走增量同步和增量抓取)。
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 每个地区生成的团地数 (每个团地 0~4 个空房)
+BENCH_DANCHI_PER_AREA = int(os.getenv("BENCH_DANCHI_PER_AREA", "30"))
+# 单个脚本的超时 (秒)
+BENCH_TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "900"))
+# 结果 JSON 的输出路径，便于和历史结果对比；不设置则只打印
+BENCH_OUTPUT = os.getenv("BENCH_OUTPUT")
+# 内存采样间隔 (秒)
+RSS_SAMPLE_INTERVAL = 0.2
+
+# (名称, 命令参数, 计数单位)：kanto 以房间为单位，其余脚本以团地为单位
+RUNS = [
+    ("kanto_cold", ["ur_kanto_scanner.py"], "rooms"),
+    ("kanto_warm", ["ur_kanto_scanner.py"], "rooms"),
+    ("tani", ["ur_tani_scanner.py"], "danchi"),
+    ("update", ["ur_update.py"], "danchi"),
+    ("watch", ["ur_watch.py", "once"], "danchi"),
+]
+
+def percentile(values, q):
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def _process_tree(root):
+    """返回 root 及其所有后代进程 (包括 Chromium) 的 pid"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm 字段可能含空格，从最后一个 ')' 之后开始解析
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class RSSSampler(threading.Thread):
+    """定期对整个进程树的 RSS 求和，记录峰值；没有 /proc 的系统上不采样"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, sum(_rss_bytes(p) for p in _process_tree(self.pid)))
+            self.stopped.wait(RSS_SAMPLE_INTERVAL)
+
+def run_script(name, args, env, log_dir):
+    """运行一个脚本，返回 (退出码, 耗时, 峰值 RSS 字节数, 日志路径)"""
+    log_path = os.path.join(log_dir, f"{name}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable] + args, cwd=REPO_ROOT, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        sampler = RSSSampler(proc.pid)
+        sampler.start()
+        try:
+            proc.wait(timeout=BENCH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        elapsed = time.perf_counter() - started
+        sampler.stopped.set()
+        sampler.join()
+    peak = sampler.peak
+    if not peak and resource is not None:
+        # 回退：子进程中内存峰值最高的一个 (不含 Chromium 的总和)
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return proc.returncode, elapsed, peak, log_path
+
+def summarize(name, unit, dataset_size, returncode, elapsed, peak, ur, notion):
+    ur_counts, ur_latencies = ur.recorder.snapshot()
+    notion_counts, notion_latencies = notion.recorder.snapshot()
+    ur_requests = sum(ur_counts.values())
+    notion_calls = sum(v for k, v in notion_counts.items() if k != "notion.429")
+    stages = {}
+    for kind, values in sorted({**ur_latencies, **notion_latencies}.items()):
+        stages[kind] = {"count": len(values),
+                        "p50_ms": round(percentile(values, 50) * 1000, 1),
+                        "p95_ms": round(percentile(values, 95) * 1000, 1)}
+    return {
+        "name": name,
+        "returncode": returncode,
+        "wall_seconds": round(elapsed, 2),
+        "ur_requests": ur_requests,
+        "pages_per_second": round(ur_requests / elapsed, 2) if elapsed else None,
+        "listings": dataset_size[unit],
+        "listing_unit": unit,
+        "notion_calls": notion_calls,
+        "notion_calls_by_kind": {k: v for k, v in sorted(notion_counts.items())},
+        "notion_calls_per_listing": round(notion_calls / dataset_size[unit], 2) if dataset_size[unit] else None,
+        "notion_429": notion_counts.get("notion.429", 0),
+        "peak_rss_mb": round(peak / 1024 / 1024, 1),
+        "stages": stages,
+    }
+
+def _label_key(entry):
+    labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+    return f"{entry['name']}{{{labels}}}" if labels else entry["name"]
+
+def load_client_metrics(path):
+    """读取子进程写出的 metrics.py 汇总：客户端视角的各阶段耗时与计数"""
+    if not os.path.exists(path):
+        return {}, {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    timers = {_label_key(t): {"count": t["count"], "p50_ms": t["p50_ms"], "p95_ms": t["p95_ms"]}
+              for t in data["timers"]}
+    counters = {_label_key(c): c["value"] for c in data["counters"]}
+    return timers, counters
+
+def print_summary(result):
+    status = "✅" if result["returncode"] == 0 else f"❌ 退出码 {result['returncode']}"
+    print(f"\n📊 === {result['name']} {status} ===")
+    print(f"   耗时 {result['wall_seconds']}s，UR 请求 {result['ur_requests']} 次 ({result['pages_per_second']} 页/秒)，"
+          f"峰值内存 {result['peak_rss_mb']} MB")
+    print(f"   Notion 调用 {result['notion_calls']} 次，每{'房间' if result['listing_unit'] == 'rooms' else '团地'} "
+          f"{result['notion_calls_per_listing']} 次 ({result['listings']} 个)，429 共 {result['notion_429']} 次")
+    if result["stages"]:
+        print("   -- 服务端 --")
+    for kind, s in result["stages"].items():
+        print(f"   {kind:<36} {s['count']:>5} 次  p50 {s['p50_ms']:>7.1f}ms  p95 {s['p95_ms']:>7.1f}ms")
+    if result["client_stages"]:
+        print("   -- 客户端 --")
+    for kind, s in result["client_stages"].items():
+        print(f"   {kind:<36} {s['count']:>5} 次  p50 {s['p50_ms']:>7.1f}ms  p95 {s['p95_ms']:>7.1f}ms")
+    if result["client_counters"]:
+        print("   " + ", ".join(f"{k}={v:g}" for k, v in result["client_counters"].items()))
+
+def main(selected):
+    dataset = fixtures.build_dataset(["tokyo", "kanagawa", "chiba"], BENCH_DANCHI_PER_AREA)
+    danchi = [d for area in dataset.values() for d in area]
+    dataset_size = {"danchi": len(danchi), "rooms": sum(len(d["rooms"]) for d in danchi)}
+    print(f"🧪 合成数据: {dataset_size['danchi']} 个团地，{dataset_size['rooms']} 个空房")
+
+    ur, ur_base = stub_servers.start_ur(dataset)
+    notion, notion_base = stub_servers.start_notion()
+    work_dir = tempfile.mkdtemp(prefix="ur_bench_")
+    targets_file = os.path.join(work_dir, "watch_targets.txt")
+    with open(targets_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(ur_base + fixtures.danchi_url(d) for d in danchi) + "\n")
+
+    env = dict(os.environ,
+               UR_BASE_URL=ur_base,
+               NOTION_API_BASE=f"{notion_base}/v1",
+               NOTION_TOKEN="bench",
+               DATABASE_ID="bench-rooms",
+               DATABASE_D_ID="bench-danchi",
+               LOCAL_STORE_PATH=os.path.join(work_dir, "ur_state.db"),
+               ALLOW_DOMAINS="127.0.0.1,localhost",
+               HEADLESS="1",
+               POLITENESS_INTERVAL="0",
+               WATCH_TARGETS_FILE=targets_file,
+               WATCH_EVENTS_FILE=os.path.join(work_dir, "watch_events.jsonl"),
+               PYTHONUNBUFFERED="1")
+
+    results = []
+    for name, args, unit in RUNS:
+        if selected and name not in selected and name.split("_")[0] not in selected:
+            continue
+        ur.recorder.reset()
+        notion.recorder.reset()
+        print(f"\n▶️ 运行 {name}: {' '.join(args)}")
+        metrics_file = os.path.join(work_dir, f"{name}.metrics.json")
+        returncode, elapsed, peak, log_path = run_script(name, args, dict(env, METRICS_FILE=metrics_file), work_dir)
+        result = summarize(name, unit, dataset_size, returncode, elapsed, peak, ur, notion)
+        result["client_stages"], result["client_counters"] = load_client_metrics(metrics_file)
+        result["log"] = log_path
+        results.append(result)
+        print_summary(result)
+        if returncode != 0:
+            print(f"   📄 日志: {log_path}")
+
+    ur.shutdown()
+    notion.shutdown()
+    if BENCH_OUTPUT:
+        with open(BENCH_OUTPUT, "w", encoding="utf-8") as f:
+            json.dump({"started": datetime.now().isoformat(timespec="seconds"), "dataset": dataset_size,
+                       "runs": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已写入 {BENCH_OUTPUT}")
+    return 0 if all(r["returncode"] == 0 for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
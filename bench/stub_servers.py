@@ -0,0 +1,278 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import fixtures
+
+# UR 桩服务器每个响应的人为延迟 (毫秒)，模拟真实网络往返
+BENCH_UR_LATENCY_MS = float(os.getenv("BENCH_UR_LATENCY_MS", "20"))
+# 假 Notion 的每个响应延迟 (毫秒)
+BENCH_NOTION_LATENCY_MS = float(os.getenv("BENCH_NOTION_LATENCY_MS", "50"))
+# 假 Notion 的限速 (与官方一致约 3 req/s)，超出返回 429
+BENCH_NOTION_RATE = float(os.getenv("BENCH_NOTION_RATE", "3"))
+BENCH_NOTION_BURST = int(os.getenv("BENCH_NOTION_BURST", "3"))
+
+class Recorder:
+    """按类别记录请求次数与服务端耗时 (秒)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.latencies = defaultdict(list)
+
+    def record(self, kind, seconds):
+        with self.lock:
+            self.counts[kind] += 1
+            self.latencies[kind].append(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.latencies.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.counts), {k: list(v) for k, v in self.latencies.items()}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+# --- UR 桩 ---
+
+UR_ROUTES = [
+    ("area", re.compile(r"^/chintai/kanto/(\w+)/area/$")),
+    ("result", re.compile(r"^/chintai/kanto/(\w+)/result/$")),
+    ("map", re.compile(r"^/chintai/kanto/(\w+)/(\d+_\d+)(?:_room)?_map\.html$")),
+    ("room", re.compile(r"^/chintai/kanto/(\w+)/(\d+_\d+)_room\.html$")),
+    ("danchi", re.compile(r"^/chintai/kanto/(\w+)/(\d+_\d+)\.html$")),
+]
+
+class URHandler(_Handler):
+    def _find(self, area, did):
+        for d in self.server.dataset.get(area, []):
+            if d["id"] == did:
+                return d
+        return None
+
+    def _route(self, path, query):
+        for kind, pattern in UR_ROUTES:
+            m = pattern.match(path)
+            if not m:
+                continue
+            area = m.group(1)
+            if kind == "area":
+                return kind, fixtures.area_page(area)
+            if kind == "result":
+                page = int(query.get("page", ["1"])[0])
+                return kind, fixtures.result_page(area, self.server.dataset.get(area, []), page)
+            d = self._find(area, m.group(2))
+            if d is None:
+                return kind, None
+            if kind == "map":
+                return kind, fixtures.map_page(d)
+            if kind == "danchi":
+                return kind, fixtures.danchi_page(d)
+            jkss = query.get("JKSS", [""])[0]
+            room = next((r for r in d["rooms"] if r["jkss"] == jkss), None)
+            return kind, fixtures.room_page(d, room) if room else None
+        return "other", None
+
+    def do_GET(self):
+        start = time.perf_counter()
+        parsed = urlparse(self.path)
+        kind, body = self._route(parsed.path, parse_qs(parsed.query))
+        time.sleep(BENCH_UR_LATENCY_MS / 1000)
+        if body is None:
+            self._send(404, "<html><body>404</body></html>")
+        else:
+            self._send(200, body)
+        self.server.recorder.record(f"ur.{kind}", time.perf_counter() - start)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        parsed = urlparse(self.path)
+        body = self._body()
+        if parsed.path != fixtures.ROOM_API_PATH:
+            self._send(404, "{}", "application/json")
+            self.server.recorder.record("ur.other", time.perf_counter() - start)
+            return
+        form = parse_qs(body.decode("utf-8"))
+        d = self._find(form.get("area", [""])[0], form.get("danchi", [""])[0])
+        time.sleep(BENCH_UR_LATENCY_MS / 1000)
+        self._send(200, fixtures.room_api(d) if d else "[]", "application/json; charset=utf-8")
+        self.server.recorder.record("ur.room_api", time.perf_counter() - start)
+
+# --- 假 Notion ---
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def _with_plain_text(properties):
+    """模拟 Notion 的返回：title / rich_text 片段带 plain_text"""
+    out = {}
+    for name, value in properties.items():
+        value = dict(value)
+        for key in ("title", "rich_text"):
+            if key in value:
+                value[key] = [dict(t, plain_text=t.get("text", {}).get("content", "")) for t in value[key]]
+        out[name] = value
+    return out
+
+class FakeNotion:
+    """内存中的数据库，只实现本仓库用到的接口与过滤条件"""
+
+    def __init__(self, rate, burst):
+        self.lock = threading.Lock()
+        self.pages = {}            # page_id -> page
+        self.databases = defaultdict(list)   # database_id -> [page_id] (创建顺序)
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def admit(self):
+        """令牌桶限速，返回 None 表示放行，否则返回建议的 Retry-After 秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.rate
+
+    def query(self, database_id, body):
+        since = None
+        f = body.get("filter") or {}
+        if f.get("timestamp") == "last_edited_time":
+            since = f["last_edited_time"].get("on_or_after")
+        with self.lock:
+            pages = [self.pages[pid] for pid in self.databases[database_id]]
+        if since:
+            pages = [p for p in pages if p["last_edited_time"] >= since]
+        start = int(body.get("start_cursor") or 0)
+        size = min(int(body.get("page_size") or 100), 100)
+        chunk = pages[start:start + size]
+        more = start + size < len(pages)
+        return {"object": "list", "results": chunk, "has_more": more,
+                "next_cursor": str(start + size) if more else None}
+
+    def schema(self, database_id):
+        with self.lock:
+            names = set()
+            for pid in self.databases[database_id]:
+                names.update(self.pages[pid]["properties"])
+        return {"object": "database", "id": database_id,
+                "properties": {n: {"id": n, "name": n} for n in sorted(names)}}
+
+    def create(self, body):
+        page_id = str(uuid.uuid4())
+        database_id = body.get("parent", {}).get("database_id")
+        now = _now()
+        page = {"object": "page", "id": page_id, "created_time": now, "last_edited_time": now,
+                "parent": {"database_id": database_id}, "archived": False,
+                "properties": _with_plain_text(body.get("properties", {}))}
+        with self.lock:
+            self.pages[page_id] = page
+            self.databases[database_id].append(page_id)
+        return page
+
+    def update(self, page_id, body):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return None
+            page["properties"].update(_with_plain_text(body.get("properties", {})))
+            if "archived" in body:
+                page["archived"] = body["archived"]
+            page["last_edited_time"] = _now()
+            return page
+
+class NotionHandler(_Handler):
+    def _json(self, status, obj, headers=None):
+        self._send(status, json.dumps(obj, ensure_ascii=False), "application/json; charset=utf-8", headers)
+
+    def _handle(self, method):
+        start = time.perf_counter()
+        notion = self.server.notion
+        path = urlparse(self.path).path
+        raw = self._body()
+        body = json.loads(raw) if raw else {}
+        kind = f"notion.{method}"
+        time.sleep(BENCH_NOTION_LATENCY_MS / 1000)
+
+        retry_after = notion.admit()
+        if retry_after is not None:
+            self._json(429, {"object": "error", "code": "rate_limited"}, {"Retry-After": f"{retry_after:.2f}"})
+            self.server.recorder.record("notion.429", time.perf_counter() - start)
+            return
+
+        m = re.match(r"^/v1/databases/([^/]+)(/query)?$", path)
+        if m and m.group(2) and method == "POST":
+            kind = "notion.query"
+            result = notion.query(m.group(1), body)
+        elif m and method == "GET":
+            kind = "notion.schema"
+            result = notion.schema(m.group(1))
+        elif path == "/v1/pages" and method == "POST":
+            kind = "notion.create"
+            result = notion.create(body)
+        elif path.startswith("/v1/pages/") and method == "PATCH":
+            kind = "notion.update"
+            result = notion.update(path.rsplit("/", 1)[1], body)
+        else:
+            result = None
+
+        if result is None:
+            self._json(404, {"object": "error", "code": "object_not_found"})
+        else:
+            self._json(200, result)
+        self.server.recorder.record(kind, time.perf_counter() - start)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+def start_server(handler, **attrs):
+    """在后台线程启动服务器 (随机端口)，返回 (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.recorder = Recorder()
+    for k, v in attrs.items():
+        setattr(server, k, v)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def start_ur(dataset):
+    return start_server(URHandler, dataset=dataset)
+
+def start_notion():
+    return start_server(NotionHandler, notion=FakeNotion(BENCH_NOTION_RATE, BENCH_NOTION_BURST))
@@ -0,0 +1,78 @@
+import os
+from collections import Counter
+from dotenv import load_dotenv
+import local_store
+import metrics
+
+load_dotenv()
+
+# 缓存有效期 (天)，路况模型会变化，过期后重新请求
+COMMUTE_CACHE_TTL_DAYS = float(os.getenv("COMMUTE_CACHE_TTL_DAYS", "30"))
+# 缓存最多保留的条数，超过后按最近使用时间淘汰
+COMMUTE_CACHE_MAX_ROWS = int(os.getenv("COMMUTE_CACHE_MAX_ROWS", "50000"))
+# 起点坐标保留的小数位数 (4 位约 10m)，同一团地的房间共用一条缓存
+COMMUTE_CACHE_PRECISION = int(os.getenv("COMMUTE_CACHE_PRECISION", "4"))
+# 出发时间按多少分钟分桶 (只看工作日/周末 + 时刻，不看日期)
+COMMUTE_BUCKET_MINUTES = int(os.getenv("COMMUTE_BUCKET_MINUTES", "30"))
+# 每写入多少条新结果检查一次缓存大小
+EVICT_EVERY = 100
+
+stats = Counter()
+
+def _place(value):
+    if isinstance(value, (tuple, list)):
+        return ",".join(f"{float(v):.{COMMUTE_CACHE_PRECISION}f}" for v in value)
+    return str(value).strip()
+
+def departure_bucket(departure_time):
+    if departure_time is None:
+        return "now"
+    day = "weekend" if departure_time.weekday() >= 5 else "weekday"
+    minutes = departure_time.hour * 60 + departure_time.minute
+    minutes -= minutes % COMMUTE_BUCKET_MINUTES
+    return f"{day}-{minutes // 60:02d}{minutes % 60:02d}"
+
+def cache_key(origin, destination, mode, departure_time=None):
+    return "|".join([_place(origin), _place(destination), mode, departure_bucket(departure_time)])
+
+def lookup(key):
+    """查询缓存并计入命中率统计，返回 (命中, 秒数)"""
+    hit, seconds = local_store.lookup_commute(key, COMMUTE_CACHE_TTL_DAYS)
+    stats["hit" if hit else "miss"] += 1
+    metrics.incr("commute_cache", result="hit" if hit else "miss")
+    return hit, seconds
+
+def store(key, seconds):
+    local_store.save_commute(key, seconds)
+    stats["stored"] += 1
+    if stats["stored"] % EVICT_EVERY == 0:
+        local_store.evict_commutes(COMMUTE_CACHE_MAX_ROWS)
+
+def directions_seconds(gmaps, origin, destination, mode="driving", departure_time=None, **kwargs):
+    """
+    先查缓存，未命中再调用 gmaps.directions，返回行程秒数 (有路况预估时取 duration_in_traffic)。
+    无法规划路线返回 None (同样缓存)；API 异常直接抛出，不写缓存。
+    """
+    key = cache_key(origin, destination, mode, departure_time)
+    hit, seconds = lookup(key)
+    if hit:
+        return seconds
+
+    with metrics.timer("google_api", api="directions"):
+        result = gmaps.directions(origin=origin, destination=destination, mode=mode,
+                                  departure_time=departure_time, **kwargs)
+    seconds = None
+    if result:
+        leg = result[0]['legs'][0]
+        seconds = leg.get('duration_in_traffic', leg['duration'])['value']
+    store(key, seconds)
+    return seconds
+
+def report():
+    """输出本次运行的缓存命中率，并把缓存裁剪到上限"""
+    evicted = local_store.evict_commutes(COMMUTE_CACHE_MAX_ROWS)
+    total = stats["hit"] + stats["miss"]
+    if not total:
+        return
+    print(f"🗃️ 通勤缓存: 命中 {stats['hit']}/{total} ({stats['hit'] / total:.0%})，"
+          f"省下 {stats['hit']} 次路线查询" + (f"，淘汰 {evicted} 条" if evicted else ""))
@@ -0,0 +1,89 @@
+import os
+import time
+from collections import Counter
+from dotenv import load_dotenv
+import commute_cache
+import metrics
+
+load_dotenv()
+
+# Distance Matrix 每次请求最多 25 个起点
+MATRIX_MAX_ORIGINS = int(os.getenv("MATRIX_MAX_ORIGINS", "25"))
+# 单个元素 (起点) 失败后的最大重试轮数
+MATRIX_RETRIES = int(os.getenv("MATRIX_RETRIES", "3"))
+# 这些状态表示路线确实不存在，结果记为 None 并缓存；其它非 OK 状态视为临时失败，重试
+NO_ROUTE_STATUSES = ("ZERO_RESULTS", "NOT_FOUND")
+
+stats = Counter()
+
+def _element_seconds(element):
+    return element.get('duration_in_traffic', element['duration'])['value']
+
+def matrix_seconds(gmaps, origins, destination, mode="driving", departure_time=None, **kwargs):
+    """
+    批量计算多个起点到同一终点的行程秒数，返回 {起点: 秒数}，无法规划路线为 None。
+    先查通勤缓存；未命中的起点 (按缓存键去重) 每 MATRIX_MAX_ORIGINS 个合成一次 Distance Matrix 请求。
+    单个元素失败只重试该元素，重试耗尽的起点不出现在返回结果中。
+    """
+    results = {}
+    pending = {}   # 缓存键 -> 使用该键的起点列表
+    for origin in origins:
+        key = commute_cache.cache_key(origin, destination, mode, departure_time)
+        if key in pending:
+            pending[key].append(origin)
+            continue
+        hit, seconds = commute_cache.lookup(key)
+        if hit:
+            results[origin] = seconds
+        else:
+            pending[key] = [origin]
+
+    for attempt in range(MATRIX_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(min(30, 2 ** attempt))
+            print(f"   🔁 第 {attempt} 轮重试 {len(pending)} 个起点")
+        failed = {}
+        keys = list(pending)
+        for i in range(0, len(keys), MATRIX_MAX_ORIGINS):
+            batch = keys[i:i + MATRIX_MAX_ORIGINS]
+            stats["requests"] += 1
+            try:
+                with metrics.timer("google_api", api="distance_matrix"):
+                    matrix = gmaps.distance_matrix(
+                        origins=[pending[k][0] for k in batch],
+                        destinations=[destination],
+                        mode=mode,
+                        departure_time=departure_time,
+                        **kwargs
+                    )
+                rows = matrix['rows']
+            except Exception as e:
+                print(f"   ⚠️ Distance Matrix 请求失败: {e}")
+                failed.update((k, pending[k]) for k in batch)
+                continue
+
+            for key, row in zip(batch, rows):
+                element = row['elements'][0]
+                status = element.get('status')
+                if status == 'OK':
+                    seconds = _element_seconds(element)
+                elif status in NO_ROUTE_STATUSES:
+                    seconds = None
+                else:
+                    failed[key] = pending[key]
+                    continue
+                stats["elements"] += 1
+                commute_cache.store(key, seconds)
+                for origin in pending[key]:
+                    results[origin] = seconds
+        pending = failed
+
+    if pending:
+        print(f"   ❌ {len(pending)} 个起点重试 {MATRIX_RETRIES} 次仍失败")
+    return results
+
+def report():
+    if stats["requests"]:
+        print(f"🧮 Distance Matrix: {stats['requests']} 次请求，算出 {stats['elements']} 个起点")
@@ -0,0 +1,169 @@
+import datetime
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from googlemaps import Client as GoogleMapsClient
+from dotenv import load_dotenv
+from notion_client import call_notion_api, iter_database, NOTION_API
+import commute_cache
+import commute_matrix
+
+load_dotenv()
+
+# === 配置区域 ===
+DATABASE_ID = os.getenv("DATABASE_D_ID")
+GMAPS_KEY = os.getenv("GMAPS_KEY")
+# 通勤目的地配置 (JSON 文件，格式同 DEFAULT_COMMUTES)；不设置则使用默认配置
+COMMUTE_CONFIG = os.getenv("COMMUTE_CONFIG")
+# 批量模式：用 Distance Matrix 一次计算多个起点 (设为 0 则逐条调用 Directions)
+COMMUTE_BATCH = os.getenv("COMMUTE_BATCH", "1") == "1"
+# 同时进行的路线查询 / Notion 写入数 (Notion 速率仍由 notion_client 的令牌桶控制)
+COMMUTE_WORKERS = int(os.getenv("COMMUTE_WORKERS", "4"))
+
+# property: 写入的 Notion 数字列；departure: 次日出发时刻 (HH:MM)，不填表示不指定出发时间
+DEFAULT_COMMUTES = [
+    {
+        "property": "宇贺时间",
+        "destination": "〒222-0033 神奈川県横浜市港北区新横浜３丁目１６−１２",
+        "mode": "driving",
+        "departure": "08:00",
+        "traffic_model": "best_guess",
+    },
+    {
+        "property": "通勤时间",
+        "destination": "涩谷站",  # 也可以传入 "35.6580,139.7016"
+        "mode": "driving",
+        "departure": "08:00",
+        "traffic_model": "best_guess",
+    },
+]
+
+gmaps = GoogleMapsClient(key=GMAPS_KEY)
+
+def load_commutes(properties=None):
+    """读取通勤配置；properties 不为空时只保留这些列"""
+    if COMMUTE_CONFIG:
+        with open(COMMUTE_CONFIG, encoding="utf-8") as f:
+            commutes = json.load(f)
+    else:
+        commutes = DEFAULT_COMMUTES
+    if properties:
+        commutes = [c for c in commutes if c["property"] in properties]
+    return commutes
+
+def route_options(commute):
+    """配置项 -> Google 路线查询参数"""
+    options = {"mode": commute.get("mode", "driving"), "language": "ja"}
+    if commute.get("departure"):
+        # 设定为明天的指定时刻出发，模拟早高峰
+        hour, minute = map(int, commute["departure"].split(":"))
+        now = datetime.datetime.now()
+        options["departure_time"] = datetime.datetime(now.year, now.month, now.day, hour, minute) + timedelta(days=1)
+        if options["mode"] == "driving":
+            options["traffic_model"] = commute.get("traffic_model", "best_guess")
+    return options
+
+def pending_filter(commutes):
+    """任意一个通勤列为空、且有坐标的房源"""
+    return {
+        "and": [
+            {"or": [{"property": c["property"], "number": {"is_empty": True}} for c in commutes]},
+            {"property": "纬度", "number": {"is_not_empty": True}},
+            {"property": "经度", "number": {"is_not_empty": True}}
+        ]
+    }
+
+def compute(commute, origins, pool):
+    """计算一组起点到某个目的地的秒数，返回 {起点: 秒数}；失败的起点不在结果中"""
+    options = route_options(commute)
+    destination = commute["destination"]
+    if COMMUTE_BATCH:
+        chunks = [origins[i:i + commute_matrix.MATRIX_MAX_ORIGINS]
+                  for i in range(0, len(origins), commute_matrix.MATRIX_MAX_ORIGINS)]
+        futures = [pool.submit(commute_matrix.matrix_seconds, gmaps, chunk, destination, **options) for chunk in chunks]
+        results = {}
+        for f in futures:
+            results.update(f.result())
+        return results
+
+    def one(origin):
+        try:
+            return origin, commute_cache.directions_seconds(gmaps, origin=origin, destination=destination, **options)
+        except Exception as e:
+            print(f" ❌ [异常]: {origin} -> {commute['property']}: {e}")
+            return None
+    return dict(r for r in pool.map(one, origins) if r)
+
+def process_pages(pages, commutes, pool):
+    """计算一批页面缺失的通勤列，每行用一次 PATCH 写回"""
+    rows = []
+    for page in pages:
+        props = page["properties"]
+        # 获取名称用于显示日志
+        name_list = props.get("房源名称", {}).get("title", [])
+        name = name_list[0]["text"]["content"] if name_list else "未知房源"
+        origin = (props["纬度"].get("number"), props["经度"].get("number"))
+        missing = [c for c in commutes if props.get(c["property"], {}).get("number") is None]
+        rows.append((page["id"], name, origin, missing))
+
+    results = {}
+    for c in commutes:
+        # 同一团地的房间坐标相同，每个目的地每个坐标只算一次
+        origins = sorted({origin for _, _, origin, missing in rows if c in missing})
+        if origins:
+            print(f" 🚗 [{c['property']}]: {len(origins)} 个坐标 -> {c['destination']}")
+        results[c["property"]] = compute(c, origins, pool)
+
+    def write(row):
+        page_id, name, origin, missing = row
+        update = {}
+        for c in missing:
+            seconds = results[c["property"]].get(origin)
+            if seconds is not None:
+                update[c["property"]] = {"number": (seconds + 59) // 60}
+        if not update:
+            print(f"   ⚠️ 无法规划路线: {name}")
+            return
+        if call_notion_api("PATCH", f"{NOTION_API}/pages/{page_id}", {"properties": update}):
+            print(f"   ⏱️ {name}: " + ", ".join(f"{k} {v['number']} 分钟" for k, v in update.items()))
+
+    list(pool.map(write, rows))
+
+def run(properties=None):
+    """
+    按配置补全通勤列：查询一次数据库，逐行找出所有缺失的列，
+    按目的地批量计算后，每行只用一次 PATCH 写回全部结果。
+    查询结果流式读取，每到一页 (100 条) 就开始计算，下一页在后台预取。
+    """
+    commutes = load_commutes(properties)
+    if not commutes:
+        print("⚠️ 没有匹配的通勤配置。")
+        return
+
+    print("📡 正在抓取具备坐标且待计算的数据...")
+    columns = ["房源名称", "纬度", "经度"] + [c["property"] for c in commutes]
+    pages = iter_database(DATABASE_ID, filter=pending_filter(commutes), filter_properties=columns)
+    total = 0
+    with ThreadPoolExecutor(max_workers=COMMUTE_WORKERS) as pool:
+        try:
+            while True:
+                chunk = list(islice(pages, 100))
+                if not chunk: break
+                total += len(chunk)
+                process_pages(chunk, commutes, pool)
+        except RuntimeError as e:
+            print(f"⚠️ {e}")
+
+    if not total:
+        print("🎉 没有需要计算的数据。")
+        return
+    print(f"🔎 共处理 {total} 条房源")
+    commute_matrix.report()
+    commute_cache.report()
+
+if __name__ == "__main__":
+    # 用法: python commute_pipeline.py [列名 ...]   不带参数时补全配置中的所有列
+    run(sys.argv[1:] or None)
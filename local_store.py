@@ -0,0 +1,250 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from notion_client import iter_database
+
+load_dotenv()
+
+# 本地状态库：记录房源存活情况等不需要每次都写回 Notion 的数据
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "ur_state.db")
+# 增量同步无法感知 Notion 中被删除/归档的页面，超过这个天数做一次全量同步
+FULL_SYNC_DAYS = float(os.getenv("FULL_SYNC_DAYS", "7"))
+# 设为 1 强制本次全量同步
+FORCE_FULL_SYNC = os.getenv("FORCE_FULL_SYNC", "0") == "1"
+# 坐标解析失败的团地，隔多少小时后再重新尝试
+COORD_UNKNOWN_TTL_HOURS = float(os.getenv("COORD_UNKNOWN_TTL_HOURS", "168"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS liveness (
+    database_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (database_id, url)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    database_id TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    info TEXT NOT NULL,
+    last_edited_time TEXT,
+    PRIMARY KEY (database_id, page_id)
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages (database_id, url);
+CREATE TABLE IF NOT EXISTS coords (
+    danchi_id TEXT PRIMARY KEY,
+    lat REAL,
+    lng REAL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watch_state (
+    url TEXT PRIMARY KEY,
+    request TEXT,
+    content_hash TEXT,
+    vacancies INTEGER,
+    checked_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commute_cache (
+    cache_key TEXT PRIMARY KEY,
+    seconds INTEGER,
+    created_at TEXT NOT NULL,
+    used_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refreshed (
+    database_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    refreshed_at TEXT NOT NULL,
+    PRIMARY KEY (database_id, url)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    full_synced_at TEXT
+);
+"""
+
+_conn = None
+_lock = threading.Lock()
+
+def connect():
+    """全局共用一个连接，读写由 _lock 串行化 (可被多个线程调用)"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(LOCAL_STORE_PATH, timeout=30, check_same_thread=False)
+            _conn.executescript(SCHEMA)
+    return _conn
+
+def record_seen(database_id, urls, seen_at):
+    """批量记录本次运行中仍在线的 URL"""
+    conn = connect()
+    with _lock, conn:
+        conn.executemany(
+            "INSERT INTO liveness (database_id, url, last_seen) VALUES (?, ?, ?) "
+            "ON CONFLICT (database_id, url) DO UPDATE SET last_seen = excluded.last_seen",
+            [(database_id, url, seen_at) for url in urls],
+        )
+
+def lookup_coords(danchi_id):
+    """
+    查询团地坐标缓存，返回 (命中, coords)。
+    coords 为 {"lat", "lng"}；命中但 coords 为 None 表示近期解析失败过，暂不重试。
+    """
+    if not danchi_id:
+        return False, None
+    conn = connect()
+    with _lock:
+        row = conn.execute("SELECT lat, lng, updated_at FROM coords WHERE danchi_id = ?", (danchi_id,)).fetchone()
+    if not row:
+        return False, None
+    lat, lng, updated_at = row
+    if lat is not None and lng is not None:
+        return True, {"lat": lat, "lng": lng}
+    if datetime.fromisoformat(updated_at) > datetime.now(timezone.utc) - timedelta(hours=COORD_UNKNOWN_TTL_HOURS):
+        return True, None
+    return False, None
+
+def save_coords(danchi_id, coords):
+    """写入团地坐标；coords 为 None 时记为未知 (不写 0.0)"""
+    if not danchi_id:
+        return
+    lat, lng = (float(coords["lat"]), float(coords["lng"])) if coords else (None, None)
+    conn = connect()
+    with _lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO coords (danchi_id, lat, lng, updated_at) VALUES (?, ?, ?, ?)",
+            (danchi_id, lat, lng, datetime.now(timezone.utc).isoformat()),
+        )
+
+def load_watch_state(url):
+    """读取巡检目标上次的状态: {"request", "content_hash", "vacancies"}，没有记录返回 None"""
+    conn = connect()
+    with _lock:
+        row = conn.execute("SELECT request, content_hash, vacancies FROM watch_state WHERE url = ?", (url,)).fetchone()
+    if not row:
+        return None
+    request, content_hash, vacancies = row
+    return {"request": json.loads(request) if request else None, "content_hash": content_hash, "vacancies": vacancies}
+
+def save_watch_state(url, request, content_hash, vacancies):
+    """保存巡检目标的房间表请求 (用于重放)、响应内容哈希与空房数"""
+    conn = connect()
+    with _lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO watch_state (url, request, content_hash, vacancies, checked_at) VALUES (?, ?, ?, ?, ?)",
+            (url, json.dumps(request, ensure_ascii=False) if request else None, content_hash, vacancies,
+             datetime.now(timezone.utc).isoformat()),
+        )
+
+def lookup_commute(cache_key, ttl_days):
+    """
+    查询通勤时间缓存，返回 (命中, 秒数)；命中但秒数为 None 表示无法规划路线。
+    超过 ttl_days 的记录视为未命中。命中时刷新 used_at 供淘汰使用。
+    """
+    now = datetime.now(timezone.utc)
+    conn = connect()
+    with _lock, conn:
+        row = conn.execute("SELECT seconds, created_at FROM commute_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        if not row or datetime.fromisoformat(row[1]) < now - timedelta(days=ttl_days):
+            return False, None
+        conn.execute("UPDATE commute_cache SET used_at = ? WHERE cache_key = ?", (now.isoformat(), cache_key))
+    return True, row[0]
+
+def save_commute(cache_key, seconds):
+    now = datetime.now(timezone.utc).isoformat()
+    conn = connect()
+    with _lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO commute_cache (cache_key, seconds, created_at, used_at) VALUES (?, ?, ?, ?)",
+            (cache_key, seconds, now, now),
+        )
+
+def evict_commutes(max_rows):
+    """缓存超过 max_rows 条时，按最近使用时间淘汰最旧的记录，返回淘汰条数"""
+    conn = connect()
+    with _lock, conn:
+        cur = conn.execute(
+            "DELETE FROM commute_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM commute_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (max_rows,),
+        )
+    return cur.rowcount
+
+def last_refreshed(database_id):
+    """返回 {url: 上次刷新时间 (ISO 字符串)}"""
+    conn = connect()
+    with _lock:
+        rows = conn.execute("SELECT url, refreshed_at FROM refreshed WHERE database_id = ?", (database_id,)).fetchall()
+    return dict(rows)
+
+def record_refreshed(database_id, url):
+    conn = connect()
+    with _lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO refreshed (database_id, url, refreshed_at) VALUES (?, ?, ?)",
+            (database_id, url, datetime.now(timezone.utc).isoformat()),
+        )
+
+def _query_pages(database_id, since=None):
+    """流式拉取数据库；since 不为空时只拉取 last_edited_time >= since 的页面"""
+    # Notion 的 last_edited_time 精确到分钟，用 on_or_after 避免漏掉同一分钟内的修改
+    query_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}} if since else None
+    try:
+        yield from iter_database(database_id, filter=query_filter)
+    except RuntimeError:
+        raise RuntimeError("Notion 查询失败，本地库保持不变")
+
+def load_existing_pages(database_id, parse_page, view=None):
+    """
+    增量同步 Notion 数据库到本地，并返回 {url: info}。
+    parse_page(page) 返回 (url, info) 或 None；info 为可 JSON 序列化的 dict，且包含 page_id。
+    同一数据库被多个脚本以不同的 parse_page 读取时，用 view 区分各自的镜像，避免 info 结构互相覆盖。
+    """
+    store_id = f"{database_id}#{view}" if view else database_id
+    conn = connect()
+    with _lock:
+        state = conn.execute("SELECT watermark, full_synced_at FROM sync_state WHERE database_id = ?", (store_id,)).fetchone()
+    watermark, full_synced_at = state if state else (None, None)
+
+    now = datetime.now(timezone.utc)
+    full = (FORCE_FULL_SYNC or not watermark or not full_synced_at
+            or datetime.fromisoformat(full_synced_at) < now - timedelta(days=FULL_SYNC_DAYS))
+
+    try:
+        upserts, removed = [], []
+        new_watermark = watermark
+        for page in _query_pages(database_id, None if full else watermark):
+            edited = page.get("last_edited_time")
+            if edited and (not new_watermark or edited > new_watermark):
+                new_watermark = edited
+            parsed = parse_page(page)
+            if parsed:
+                url, info = parsed
+                upserts.append((store_id, page["id"], url, json.dumps(info, ensure_ascii=False), edited))
+            else:
+                removed.append((store_id, page["id"]))
+    except RuntimeError as e:
+        print(f"⚠️ {e}")
+        upserts = None
+
+    with _lock, conn:
+        if upserts is not None:
+            if full:
+                conn.execute("DELETE FROM pages WHERE database_id = ?", (store_id,))
+            conn.executemany("DELETE FROM pages WHERE database_id = ? AND page_id = ?", removed)
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (database_id, page_id, url, info, last_edited_time) VALUES (?, ?, ?, ?, ?)",
+                upserts,
+            )
+            conn.execute(
+                "INSERT INTO sync_state (database_id, watermark, full_synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (database_id) DO UPDATE SET watermark = excluded.watermark, "
+                "full_synced_at = COALESCE(excluded.full_synced_at, sync_state.full_synced_at)",
+                (store_id, new_watermark, now.isoformat() if full else None),
+            )
+            print(f"🗄️ 本地库{'全量' if full else '增量'}同步: 更新 {len(upserts)} 条")
+        rows = conn.execute("SELECT url, info FROM pages WHERE database_id = ?", (store_id,)).fetchall()
+
+    return {url: json.loads(info) for url, info in rows}
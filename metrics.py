@@ -0,0 +1,174 @@
+import atexit
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- 配置 ---
+# 设置后启用指标，运行结束时写入本次运行的 JSON 汇总
+METRICS_FILE = os.getenv("METRICS_FILE")
+# 可选：同时写入 Prometheus 文本格式 (供 node_exporter 的 textfile collector 采集)
+METRICS_PROM_FILE = os.getenv("METRICS_PROM_FILE")
+# 两者都不设置时，timer / incr 直接返回，几乎没有开销
+ENABLED = bool(METRICS_FILE or METRICS_PROM_FILE)
+PROM_PREFIX = "ur_"
+
+# (名称, 标签) -> 耗时列表 (秒) / 计数
+_timings = defaultdict(list)
+_counters = defaultdict(float)
+_lock = threading.Lock()
+_started = time.time()
+_NULL = nullcontext()
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, seconds, **labels):
+    """记录一次耗时 (秒)"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _timings[key].append(seconds)
+
+def incr(name, value=1, **labels):
+    """计数器加 value"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+
+class _Timer:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            incr(f"{self.name}_errors", **self.labels)
+        return False
+
+def timer(name, **labels):
+    """
+    计时上下文管理器，同步和异步代码都可以用：
+        with metrics.timer("goto", stage="room"):
+            await page.goto(url)
+    抛出异常时同样记录耗时，并把 <name>_errors 计数加一。
+    """
+    if not ENABLED:
+        return _NULL
+    return _Timer(name, labels)
+
+def snapshot():
+    """当前进程的原始指标 (可 pickle)，子进程用它把指标带回主进程"""
+    with _lock:
+        return {"timings": {k: list(v) for k, v in _timings.items()}, "counters": dict(_counters)}
+
+def merge(data):
+    """把 snapshot() 的结果合并进当前进程"""
+    with _lock:
+        for key, values in data["timings"].items():
+            _timings[key].extend(values)
+        for key, value in data["counters"].items():
+            _counters[key] += value
+
+def _percentile(ordered, q):
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def summary():
+    """当前进程的指标汇总 (可直接序列化为 JSON)"""
+    with _lock:
+        timings = {k: sorted(v) for k, v in _timings.items()}
+        counters = dict(_counters)
+    return {
+        "script": os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python",
+        "started": datetime.fromtimestamp(_started).isoformat(timespec="seconds"),
+        "wall_seconds": round(time.time() - _started, 3),
+        "timers": [
+            {"name": name, "labels": dict(labels), "count": len(v), "sum_seconds": round(sum(v), 6),
+             "p50_ms": round(_percentile(v, 50) * 1000, 3), "p95_ms": round(_percentile(v, 95) * 1000, 3),
+             "max_ms": round(v[-1] * 1000, 3)}
+            for (name, labels), v in sorted(timings.items())
+        ],
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+    }
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_prom_escape(v)}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+def prometheus_text(data):
+    """汇总 -> Prometheus 文本格式：耗时为 summary (p50/p95)，计数为 counter"""
+    lines = []
+    script = {"script": data["script"]}
+    typed = set()
+    for t in data["timers"]:
+        metric = f"{PROM_PREFIX}{t['name']}_seconds"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} summary")
+            typed.add(metric)
+        labels = {**script, **t["labels"]}
+        for q, field in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+            lines.append(f"{metric}{_prom_labels({**labels, 'quantile': q})} {round(t[field] / 1000, 6)}")
+        lines.append(f"{metric}_sum{_prom_labels(labels)} {t['sum_seconds']}")
+        lines.append(f"{metric}_count{_prom_labels(labels)} {t['count']}")
+    for c in data["counters"]:
+        metric = f"{PROM_PREFIX}{c['name']}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_prom_labels({**script, **c['labels']})} {c['value']}")
+    lines.append(f"# TYPE {PROM_PREFIX}run_wall_seconds gauge")
+    lines.append(f"{PROM_PREFIX}run_wall_seconds{_prom_labels(script)} {data['wall_seconds']}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    # 先写临时文件再替换，采集方不会读到写了一半的文件
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def write():
+    """写出本次运行的指标文件；进程正常退出时自动调用"""
+    # AREA_PARALLEL=process 的子进程也会导入本模块，其指标由 ur_areas 带回主进程合并，只由主进程写文件
+    if not ENABLED or multiprocessing.parent_process() is not None:
+        return
+    data = summary()
+    try:
+        if METRICS_FILE:
+            _write_atomic(METRICS_FILE, json.dumps(data, ensure_ascii=False, indent=2))
+        if METRICS_PROM_FILE:
+            _write_atomic(METRICS_PROM_FILE, prometheus_text(data))
+    except OSError as e:
+        print(f"⚠️ 指标写入失败: {e}")
+        return
+    print(f"📈 指标已写入 {', '.join(p for p in (METRICS_FILE, METRICS_PROM_FILE) if p)}")
+
+if ENABLED:
+    atexit.register(write)
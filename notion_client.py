@@ -0,0 +1,226 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from urllib.parse import unquote, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# --- 配置 ---
+NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+NOTION_API = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1").rstrip("/")
+NOTION_VERSION = "2022-06-28"
+# Notion 官方限速约 3 req/s，允许短时突发
+NOTION_RATE = float(os.getenv("NOTION_RATE", "3"))
+NOTION_BURST = int(os.getenv("NOTION_BURST", "3"))
+MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+POOL_SIZE = 16
+
+class TokenBucket:
+    """线程安全的令牌桶，所有线程 / 协程共用一个实例"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """收到 429 时让所有调用方一起暂停"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+limiter = TokenBucket(NOTION_RATE, NOTION_BURST)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers.update({
+                "Authorization": f"Bearer {NOTION_TOKEN}",
+                "Content-Type": "application/json",
+                "Notion-Version": NOTION_VERSION,
+            })
+    return _session
+
+def _backoff(attempt):
+    return min(30, 2 ** attempt) + random.uniform(0, 0.5)
+
+def _endpoint(url):
+    """/v1/databases/{id}/query -> databases/query，去掉 ID 后用作指标标签"""
+    words = [p for p in urlparse(url).path.split("/") if p in ("pages", "databases", "blocks", "children", "query", "search")]
+    return "/".join(words) or "other"
+
+def _connect_failed(e):
+    """请求在建立连接阶段就失败了 (肯定没有发到服务器)"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, NewConnectionError)
+
+def call_notion_api(method, url, data=None, params=None, retry_unsafe=True):
+    """
+    同步调用 Notion API，返回 JSON；遇到 429/5xx/网络异常按 Retry-After 或指数退避重试。
+    重试耗尽或其它错误时返回 None。url 可以是完整地址，也可以是 "/pages" 这样的路径。
+    retry_unsafe=False 用于非幂等请求 (新建页面)：只重试 429 和连接阶段的失败，
+    读超时、连接中断、5xx 时请求可能已经生效，重试会生成重复页面，直接返回 None。
+    """
+    if url.startswith("/"):
+        url = NOTION_API + url
+    endpoint = _endpoint(url) if metrics.ENABLED else None
+
+    for attempt in range(MAX_RETRIES + 1):
+        with metrics.timer("notion_throttle"):
+            limiter.acquire()
+        try:
+            with metrics.timer("notion_request", method=method, endpoint=endpoint):
+                response = get_session().request(method, url, json=data, params=params, timeout=30)
+        except requests.RequestException as e:
+            if not retry_unsafe and not _connect_failed(e):
+                metrics.incr("notion_errors", method=method, status="network")
+                print(f"❌ 网络请求异常 (请求可能已生效，不重试): {e}")
+                return None
+            metrics.incr("notion_retries", method=method, reason="network")
+            wait = _backoff(attempt)
+            print(f"❌ 网络请求异常: {e}，{wait:.1f}s 后重试")
+            time.sleep(wait)
+            continue
+
+        if response.status_code >= 500 and not retry_unsafe:
+            metrics.incr("notion_errors", method=method, status=response.status_code)
+            print(f"❌ Notion API 错误 ({response.status_code})，请求可能已生效，不重试: {method} {url}")
+            return None
+
+        if response.status_code == 429 or response.status_code >= 500:
+            metrics.incr("notion_retries", method=method, reason=response.status_code)
+            retry_after = response.headers.get("Retry-After")
+            wait = float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else _backoff(attempt)
+            print(f"⏳ Notion API 繁忙 ({response.status_code})，{wait:.1f}s 后重试")
+            if response.status_code == 429:
+                limiter.pause(wait)
+            else:
+                time.sleep(wait)
+            continue
+
+        if response.status_code not in [200, 201]:
+            metrics.incr("notion_errors", method=method, status=response.status_code)
+            print(f"❌ Notion API 错误 ({response.status_code}): {response.text}")
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            metrics.incr("notion_errors", method=method, status="invalid_json")
+            print(f"❌ Notion API 返回内容无法解析: {e}")
+            return None
+
+    metrics.incr("notion_errors", method=method, status="retries_exhausted")
+    print(f"❌ Notion API 重试 {MAX_RETRIES} 次仍失败: {method} {url}")
+    return None
+
+async def acall_notion_api(method, url, data=None, params=None, retry_unsafe=True):
+    """异步版本：在线程池中执行，限速器与同步调用共享"""
+    return await asyncio.to_thread(call_notion_api, method, url, data, params, retry_unsafe)
+
+_property_ids = {}
+
+def property_ids(database_id, names):
+    """列名 -> 属性 ID (filter_properties 需要 ID)；数据库结构只查询一次，找不到的列名原样返回"""
+    if database_id not in _property_ids:
+        res = call_notion_api("GET", f"{NOTION_API}/databases/{database_id}")
+        if not res:
+            # 查询失败不缓存，下次调用重新查询
+            return list(names)
+        # 属性 ID 本身是 URL 编码过的，解码后交给 requests 重新编码
+        _property_ids[database_id] = {k: unquote(v["id"]) for k, v in res.get("properties", {}).items()}
+    mapping = _property_ids[database_id]
+    return [mapping.get(n, n) for n in names]
+
+def iter_database(database_id, filter=None, sorts=None, filter_properties=None, page_size=100):
+    """
+    流式遍历数据库查询结果，逐条产出页面。
+    后台线程预取下一页：处理当前 100 条的同时下一页已经在请求中，内存中最多保留两页。
+    filter_properties 为列名列表时只返回这些列。查询失败时抛出 RuntimeError (已产出的页面不受影响)。
+    """
+    body = {"page_size": page_size}
+    if filter: body["filter"] = filter
+    if sorts: body["sorts"] = sorts
+    params = {"filter_properties": property_ids(database_id, filter_properties)} if filter_properties else None
+    url = f"{NOTION_API}/databases/{database_id}/query"
+    pages = queue.Queue(maxsize=1)
+    stop = threading.Event()
+
+    def put(res):
+        # 调用方提前结束迭代时不再阻塞在 put 上
+        while not stop.is_set():
+            try:
+                pages.put(res, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def prefetch():
+        cursor = None
+        finished = False
+        try:
+            while not stop.is_set():
+                res = call_notion_api("POST", url, dict(body, start_cursor=cursor) if cursor else body, params)
+                put(res)
+                if not res or not res.get("has_more"):
+                    finished = True
+                    return
+                cursor = res.get("next_cursor")
+        finally:
+            # 预取线程异常退出时放入失败标记，否则调用方会一直阻塞在 get 上
+            if not finished:
+                put(None)
+
+    threading.Thread(target=prefetch, daemon=True).start()
+    try:
+        while True:
+            res = pages.get()
+            if not res:
+                raise RuntimeError("Notion 数据库查询失败")
+            yield from res.get("results", [])
+            if not res.get("has_more"):
+                return
+    finally:
+        stop.set()
+
+def parse_notion_time(value):
+    """Notion 日期字符串 -> 本地时间 (naive datetime)，无法解析返回 None"""
+    if not value: return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from collections import Counter
+from notion_client import acall_notion_api, NOTION_API
+
+# 并发写入任务数；实际速率由 notion_client 的令牌桶控制
+NOTION_WRITERS = int(os.getenv("NOTION_WRITERS", "3"))
+# 队列积压超过这个数量时提示一次 (抓取远快于 Notion 限速，积压的写入要在退出前发完)
+NOTION_QUEUE_WARN = int(os.getenv("NOTION_QUEUE_WARN", "1000"))
+
+class NotionWriter:
+    """
+    Notion 写入的后台队列 (write-behind)：抓取协程只负责投递，不等待网络往返。
+    同一页面尚未发出的多次 PATCH 会合并成一次请求。
+    回调 on_done(res) 在事件循环中同步执行，res 为 None 表示写入失败。
+    """
+
+    def __init__(self, workers=NOTION_WRITERS):
+        self.workers = workers
+        self.queue = asyncio.Queue()
+        self.pending = {}   # page_id -> 尚未发出的 PATCH
+        self.tasks = []
+        self.stats = Counter()
+        self.backlogged = False
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    def patch(self, page_id, properties, on_done=None):
+        entry = self.pending.get(page_id)
+        if entry:
+            entry["properties"].update(properties)
+            if on_done: entry["callbacks"].append(on_done)
+            self.stats["coalesced"] += 1
+            return
+        self.pending[page_id] = {"properties": dict(properties), "callbacks": [on_done] if on_done else []}
+        self.queue.put_nowait(("PATCH", page_id))
+        self._check_backlog()
+
+    def create(self, database_id, properties, on_done=None):
+        entry = {
+            "body": {"parent": {"database_id": database_id}, "properties": properties},
+            "callbacks": [on_done] if on_done else [],
+        }
+        self.queue.put_nowait(("POST", entry))
+        self._check_backlog()
+
+    def _check_backlog(self):
+        size = self.queue.qsize()
+        if size >= NOTION_QUEUE_WARN and not self.backlogged:
+            self.backlogged = True
+            print(f"⚠️ Notion 写入积压 {size} 个，退出时会等待全部发完")
+        elif size < NOTION_QUEUE_WARN // 2:
+            self.backlogged = False
+
+    async def _run(self):
+        while True:
+            kind, key = await self.queue.get()
+            try:
+                if kind == "PATCH":
+                    entry = self.pending.pop(key)
+                    res = await acall_notion_api("PATCH", f"{NOTION_API}/pages/{key}", {"properties": entry["properties"]})
+                else:
+                    entry = key
+                    # 新建页面不是幂等的，可能已生效的失败不重试，以免出现重复行
+                    res = await acall_notion_api("POST", f"{NOTION_API}/pages", entry["body"], retry_unsafe=False)
+                self.stats[f"{kind}_{'ok' if res else 'failed'}"] += 1
+                for cb in entry["callbacks"]:
+                    cb(res)
+            except Exception as e:
+                print(f"❌ Notion 写入任务异常: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        """等待队列中的写入全部完成后停止后台任务"""
+        if self.queue.qsize():
+            print(f"⏳ 等待 {self.queue.qsize()} 个 Notion 写入完成...")
+        await self.queue.join()
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.stats:
+            print("📝 Notion 写入统计: " + ", ".join(f"{k}={v}" for k, v in sorted(self.stats.items())))
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
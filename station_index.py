@@ -0,0 +1,132 @@
+import bisect
+import csv
+import math
+import os
+from dotenv import load_dotenv
+
+# numpy 为可选依赖：安装后用向量化 haversine 批量计算，否则用纯 Python (按纬度预筛选)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+load_dotenv()
+
+# 车站数据 CSV (例如 駅データ.jp 的 station 表)，至少包含 站名 / 纬度 / 经度 三列
+STATIONS_CSV = os.getenv("STATIONS_CSV", "stations.csv")
+# 直线距离 -> 实际步行距离的绕路系数，可用 calibrate_detour 根据 Google 的结果校准
+WALK_DETOUR = float(os.getenv("WALK_DETOUR", "1.3"))
+# 步行速度 (米/分钟)，日本不动产广告的标准为 80m/分
+WALK_SPEED = float(os.getenv("WALK_SPEED", "80"))
+
+EARTH_RADIUS = 6371008.8
+NAME_COLUMNS = ("station_name", "name", "駅名")
+LAT_COLUMNS = ("lat", "latitude", "緯度")
+LON_COLUMNS = ("lon", "lng", "longitude", "経度")
+# 每批计算的房源数，控制 numpy 距离矩阵的内存占用
+CHUNK = 256
+
+def _pick(columns, candidates):
+    for c in candidates:
+        if c in columns:
+            return c
+    raise ValueError(f"车站 CSV 缺少列: {' / '.join(candidates)}")
+
+def haversine(lat1, lng1, lat2, lng2):
+    """两点间的球面距离 (米)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+def walk_minutes(distance_m, detour=None, speed=None):
+    """直线距离 -> 估算步行分钟数 (向上取整)"""
+    detour = WALK_DETOUR if detour is None else detour
+    speed = WALK_SPEED if speed is None else speed
+    return max(1, math.ceil(distance_m * detour / speed))
+
+def calibrate_detour(samples):
+    """
+    用 (直线距离米, 实测步行秒数) 样本估算绕路系数，返回中位数；没有样本返回 None。
+    结果可写入 WALK_DETOUR 环境变量。
+    """
+    ratios = sorted(seconds / 60 * WALK_SPEED / dist for dist, seconds in samples if dist > 0)
+    if not ratios:
+        return None
+    mid = len(ratios) // 2
+    return ratios[mid] if len(ratios) % 2 else (ratios[mid - 1] + ratios[mid]) / 2
+
+class StationIndex:
+    """车站坐标索引：批量查询每个坐标最近的 k 个车站"""
+
+    def __init__(self, stations):
+        # 同一车站在多条线路上重复出现，按 站名 + 坐标 去重
+        unique = {}
+        for name, lat, lng in stations:
+            unique.setdefault((name, round(lat, 4), round(lng, 4)), (name, lat, lng))
+        self.stations = sorted(unique.values(), key=lambda s: s[1])
+        self.lats = [s[1] for s in self.stations]
+        if np is not None:
+            self._lat = np.radians(np.array(self.lats))
+            self._lng = np.radians(np.array([s[2] for s in self.stations]))
+
+    @classmethod
+    def load(cls, path=STATIONS_CSV):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            name_col = _pick(reader.fieldnames, NAME_COLUMNS)
+            lat_col = _pick(reader.fieldnames, LAT_COLUMNS)
+            lon_col = _pick(reader.fieldnames, LON_COLUMNS)
+            stations = []
+            for row in reader:
+                # 駅データ.jp 中 e_status != 0 表示已废止的车站
+                if row.get("e_status", "0") not in ("", "0"):
+                    continue
+                try:
+                    stations.append((row[name_col], float(row[lat_col]), float(row[lon_col])))
+                except (TypeError, ValueError):
+                    continue
+        return cls(stations)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def nearest(self, points, k=4, radius=3000):
+        """
+        points 为 [(lat, lng), ...]，返回同样长度的列表，
+        每项为 radius 米内按距离排序的最多 k 个 (站名, 纬度, 经度, 直线距离米)。
+        """
+        if not self.stations:
+            return [[] for _ in points]
+        if np is not None:
+            return self._nearest_numpy(points, k, radius)
+        return [self._nearest_python(lat, lng, k, radius) for lat, lng in points]
+
+    def _nearest_numpy(self, points, k, radius):
+        results = []
+        k = min(k, len(self.stations))
+        for start in range(0, len(points), CHUNK):
+            chunk = np.radians(np.array(points[start:start + CHUNK], dtype=float).reshape(-1, 2))
+            lat = chunk[:, 0:1]
+            lng = chunk[:, 1:2]
+            a = (np.sin((self._lat - lat) / 2) ** 2
+                 + np.cos(lat) * np.cos(self._lat) * np.sin((self._lng - lng) / 2) ** 2)
+            dist = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            for row, cand in zip(dist, idx):
+                found = sorted((float(row[i]), int(i)) for i in cand if row[i] <= radius)
+                results.append([(*self.stations[i], d) for d, i in found])
+        return results
+
+    def _nearest_python(self, lat, lng, k, radius):
+        # 纬度 1 度约 111km，先按纬度范围二分预筛选
+        margin = radius / 111000
+        lo = bisect.bisect_left(self.lats, lat - margin)
+        hi = bisect.bisect_right(self.lats, lat + margin)
+        found = []
+        for name, s_lat, s_lng in self.stations[lo:hi]:
+            d = haversine(lat, lng, s_lat, s_lng)
+            if d <= radius:
+                found.append((name, s_lat, s_lng, d))
+        found.sort(key=lambda s: s[3])
+        return found[:k]
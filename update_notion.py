@@ -1,114 +1,141 @@
-import requests
 import json
+import time
+from itertools import islice
 from datetime import datetime
 from googlemaps import Client as GoogleMapsClient
 
 import os
 from dotenv import load_dotenv
+from notion_client import call_notion_api, iter_database, NOTION_API
+import station_index
+import metrics
 
 # 加载 .env 文件
 load_dotenv()
 
 # 从环境变量读取（代码里不再出现真实的字符串）
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID = os.getenv("DATABASE_ID")
 GMAPS_KEY = os.getenv("GMAPS_KEY")
+# 步行时间默认用本地车站索引离线估算；设为 1 时再用 Google 对最近的车站精算一次
+WALK_REFINE = os.getenv("WALK_REFINE", "0") == "1"
 
-gmaps = GoogleMapsClient(key=GMAPS_KEY)
-
-def call_notion_api(method, url, data=None):
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28"
-    }
-    response = requests.request(method, url, headers=headers, json=data)
-    if response.status_code != 200:
-        print(f"Error: {response.status_code}, {response.text}")
-    return response.json()
+gmaps = GoogleMapsClient(key=GMAPS_KEY) if GMAPS_KEY else None
+# Google 精算结果 (直线距离, 实测秒数)，用于给出绕路系数的校准建议
+calibration = []
 
 def update_walking_time_via_coords():
-    query_url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    
     # 过滤器：只抓取“步行时间”为空，且“纬度/经度”已有的数据
     filter_data = {
-        "filter": {
-            "and": [
-                {"property": "步行时间", "number": {"is_empty": True}},
-                {"property": "纬度", "number": {"is_not_empty": True}},
-                {"property": "经度", "number": {"is_not_empty": True}}
-            ]
-        }
+        "and": [
+            {"property": "步行时间", "number": {"is_empty": True}},
+            {"property": "纬度", "number": {"is_not_empty": True}},
+            {"property": "经度", "number": {"is_not_empty": True}}
+        ]
     }
 
+    try:
+        index = station_index.StationIndex.load()
+        print(f"🚉 本地车站索引: {len(index)} 站")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 车站数据不可用 ({e})，回退到逐条调用 Google")
+        index = None
+
+    # 边读边算：每到一页 (100 条) 就开始计算，下一页在后台预取
     print("📡 正在从 Notion 抓取具备坐标的数据...")
-    all_pages = []
-    has_more = True
-    next_cursor = None
-
-    while has_more:
-        payload = filter_data.copy()
-        if next_cursor: payload["start_cursor"] = next_cursor
-        res = call_notion_api("POST", query_url, data=payload)
-        all_pages.extend(res.get("results", []))
-        has_more = res.get("has_more", False)
-        next_cursor = res.get("next_cursor")
-
-    if not all_pages:
+    pages = iter_database(DATABASE_ID, filter=filter_data, filter_properties=["房源名称", "纬度", "经度"])
+    total, elapsed = 0, 0.0
+    try:
+        while True:
+            chunk = list(islice(pages, 100))
+            if not chunk: break
+            total += len(chunk)
+            elapsed += update_rows(chunk, index)
+    except RuntimeError as e:
+        print(f"⚠️ {e}")
+
+    if not total:
         print("🎉 没有需要计算步行时间的数据（或坐标缺失）。")
         return
-
-    print(f"🔎 找到 {len(all_pages)} 条具备坐标的数据，开始计算...")
-
-    for page in all_pages:
-        page_id = page["id"]
+    print(f"🔎 共处理 {total} 条具备坐标的数据，步行时间计算用时 {elapsed:.2f}s")
+    if calibration:
+        print(f"📐 Google 实测校准建议 WALK_DETOUR={station_index.calibrate_detour(calibration):.2f} ({len(calibration)} 个样本)")
+
+def update_rows(pages, index):
+    """计算一批页面的步行时间并写回 Notion，返回计算耗时 (秒，不含写入)"""
+    rows = []
+    for page in pages:
         props = page["properties"]
-
-        # 1. 直接获取经纬度数值
-        lat = props["纬度"].get("number")
-        lng = props["经度"].get("number")
-        
         # 获取房源名称（仅用于日志打印）
         name_list = props.get("房源名称", {}).get("title", [])
         address = name_list[0]["text"]["content"] if name_list else "未知房源"
-
-        print(f" 🚀 [开始计算]: {address} ({lat}, {lng})")
-
+        rows.append((page["id"], address, props["纬度"].get("number"), props["经度"].get("number")))
+
+    # 同一团地的房间坐标相同，每个坐标只计算一次
+    started = time.monotonic()
+    coords = sorted({(lat, lng) for _, _, lat, lng in rows})
+    if index is not None:
+        nearest = dict(zip(coords, index.nearest(coords, k=4, radius=3000)))
+        minutes = {c: estimate_walk(c, nearest[c]) for c in coords}
+    else:
+        minutes = {c: google_walk_minutes(c) for c in coords}
+    elapsed = time.monotonic() - started
+
+    for page_id, address, lat, lng in rows:
+        min_time = minutes.get((lat, lng))
+        if min_time is None:
+            print(f" ❌ [异常]: {address} 步行时间计算失败")
+            continue
+        if min_time == 999:
+            print(f" ⚠️ [未找到]: {address} 周边 3km 无车站")
+        call_notion_api("PATCH", f"{NOTION_API}/pages/{page_id}", {"properties": {"步行时间": {"number": min_time}}})
+        if min_time != 999:
+            print(f" ✅ [成功]: {address} -> 步行 {min_time} 分钟")
+    return elapsed
+
+def estimate_walk(origin, stations):
+    """用本地索引的最近车站估算步行分钟数；WALK_REFINE 时用 Google 精算最近的候选站"""
+    if not stations:
+        return 999
+    name, s_lat, s_lng, distance = stations[0]
+    if WALK_REFINE and gmaps:
         try:
-            # 2. 搜索最近车站（基于经纬度坐标）
-            # 直接使用坐标 (lat, lng)，精确度极高
+            with metrics.timer("google_api", api="distance_matrix"):
+                matrix = gmaps.distance_matrix(origins=origin, destinations=(s_lat, s_lng), mode="walking")
+            element = matrix['rows'][0]['elements'][0]
+            if element.get('status') == 'OK':
+                calibration.append((distance, element['duration']['value']))
+                return (element['duration']['value'] + 59) // 60
+        except Exception as e:
+            print(f" ⚠️ [精算失败]: {name} -> {e}，使用估算值")
+    return station_index.walk_minutes(distance)
+
+def google_walk_minutes(origin):
+    """没有车站数据时的旧路径：Places 搜索最近车站 + Distance Matrix 步行时间"""
+    lat, lng = origin
+    try:
+        # 直接使用坐标 (lat, lng)，精确度极高
+        with metrics.timer("google_api", api="places_nearby"):
             places = gmaps.places_nearby(location=(lat, lng), radius=3000, type='train_station')
-            stations = places.get('results', [])[:4]
-
-            if not stations:
-                print(f" ⚠️ [未找到]: {address} 周边 3km 无车站")
-                call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{page_id}", 
-                               {"properties": {"步行时间": {"number": 999}}})
-                continue
+        stations = places.get('results', [])[:4]
+        if not stations:
+            return 999
 
-            # 3. 计算从坐标到车站的步行时间
-            dest_ids = [f"place_id:{st['place_id']}" for st in stations]
+        dest_ids = [f"place_id:{st['place_id']}" for st in stations]
+        with metrics.timer("google_api", api="distance_matrix"):
             matrix = gmaps.distance_matrix(
                 origins=(lat, lng),
                 destinations=dest_ids,
                 mode="walking"
             )
 
-            durations = []
-            for element in matrix['rows'][0]['elements']:
-                if element.get('status') == 'OK':
-                    durations.append(element['duration']['value'])
-
-            if durations:
-                min_time = (min(durations) + 59) // 60
-                
-                # 4. 更新回 Notion
-                update_data = {"properties": {"步行时间": {"number": min_time}}}
-                call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{page_id}", update_data)
-                print(f" ✅ [成功]: {address} -> 步行 {min_time} 分钟")
-
-        except Exception as e:
-            print(f" ❌ [异常]: {address} -> {e}")
+        durations = []
+        for element in matrix['rows'][0]['elements']:
+            if element.get('status') == 'OK':
+                durations.append(element['duration']['value'])
+        return (min(durations) + 59) // 60 if durations else None
+    except Exception as e:
+        print(f" ❌ [异常]: ({lat}, {lng}) -> {e}")
+        return None
 
 if __name__ == "__main__":
     update_walking_time_via_coords()
\ No newline at end of file
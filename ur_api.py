@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse, parse_qsl, urlencode
+from dotenv import load_dotenv
+import ur_http
+
+load_dotenv()
+
+UR_BASE = ur_http.UR_BASE
+# 设置后把捕获到的 JSON 请求/响应保存为离线 fixture
+UR_CAPTURE_DIR = os.getenv("UR_CAPTURE_DIR")
+# JSON 中表示租金的字段名 (按顺序尝试)，UR 接口字段变化时可通过环境变量调整
+RENT_KEYS = [k.strip() for k in os.getenv("UR_API_RENT_KEYS", "rent,price,yachin,rent_normal").split(",") if k.strip()]
+
+ROOM_URL_RE = re.compile(r'/chintai/.+_room\.html')
+DANCHI_URL_RE = re.compile(r'/chintai/.+/\d+_\d+\.html')
+
+def _to_int(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        digits = re.findall(r'\d+', value.split("円")[0])
+        return int(''.join(digits)) if digits else None
+    return None
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for v in node.values():
+            yield from _walk(v)
+    elif isinstance(node, list):
+        for v in node:
+            yield from _walk(v)
+
+def _find_url(obj, pattern):
+    for v in obj.values():
+        if isinstance(v, str) and pattern.search(v):
+            return urljoin(UR_BASE, v)
+    return None
+
+def extract_rooms(payload):
+    """从搜索接口 JSON 中提取房间: [{"href": 详情页完整 URL, "price": 租金或 None}]"""
+    rooms = {}
+    for obj in _walk(payload):
+        url = _find_url(obj, ROOM_URL_RE)
+        if not url or url in rooms: continue
+        price = None
+        for key in RENT_KEYS:
+            if key in obj:
+                price = _to_int(obj[key])
+                if price: break
+        rooms[url] = {"href": url, "price": price}
+    return list(rooms.values())
+
+def extract_danchi(payload):
+    """从搜索接口 JSON 中提取团地详情页 URL (排除房间页)"""
+    urls = []
+    for obj in _walk(payload):
+        url = _find_url(obj, DANCHI_URL_RE)
+        if url and not ROOM_URL_RE.search(url) and url not in urls:
+            urls.append(url)
+    return urls
+
+class SearchCapture:
+    """
+    挂在结果页上，记录页面后台发出的 JSON 请求 (XHR/fetch)。
+    take() 取出自上次调用以来捕获到的响应 (先等待正在读取的响应体处理完，避免只拿到一部分)，
+    last_request 保存最近一次搜索请求用于脱离浏览器重放。
+    match 为正则时，URL 匹配的请求即视为搜索请求 (结果为空也记录，例如没有空房的团地)。
+    """
+
+    def __init__(self, capture_dir=UR_CAPTURE_DIR, match=None):
+        self.capture_dir = capture_dir
+        self.match = re.compile(match) if match else None
+        self.payloads = []
+        self.last_request = None
+        self.pending = set()   # 尚未处理完的响应任务
+
+    def attach(self, page):
+        page.on("response", self._schedule)
+
+    def _schedule(self, response):
+        task = asyncio.ensure_future(self._on_response(response))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def drain(self):
+        """等待已收到的响应全部处理完 (response.json() 需要再往返一次浏览器)"""
+        while self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+
+    async def _on_response(self, response):
+        req = response.request
+        if req.resource_type not in ("xhr", "fetch"): return
+        if "json" not in (response.headers.get("content-type") or ""): return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        record = {"url": response.url, "method": req.method, "post_data": req.post_data, "payload": payload}
+        self.payloads.append(payload)
+        if self.match:
+            if self.match.search(response.url):
+                self.last_request = record
+        elif extract_rooms(payload) or extract_danchi(payload):
+            self.last_request = record
+        if self.capture_dir:
+            save_fixture(self.capture_dir, record)
+
+    async def take(self):
+        await self.drain()
+        payloads, self.payloads = self.payloads, []
+        return payloads
+
+def fixture_key(method, url, post_data):
+    """同一路径 + 查询参数 + 请求体对应同一个 fixture 文件"""
+    parsed = urlparse(url)
+    target = f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+    digest = hashlib.sha1(f"{method} {target} {post_data or ''}".encode("utf-8")).hexdigest()[:12]
+    return f"{parsed.path.strip('/').replace('/', '_') or 'root'}_{digest}.json"
+
+def save_fixture(directory, record):
+    os.makedirs(directory, exist_ok=True)
+    name = fixture_key(record["method"], record["url"], record["post_data"])
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=1)
+
+def fetch_json(record, **overrides):
+    """
+    脱离浏览器重放捕获到的请求，overrides 覆盖表单/查询参数 (例如翻页参数)。
+    失败返回 None。
+    """
+    method = record["method"].upper()
+    try:
+        if method == "POST":
+            form = dict(parse_qsl(record.get("post_data") or "", keep_blank_values=True))
+            form.update({k: str(v) for k, v in overrides.items()})
+            res = ur_http.get_session().post(record["url"], data=form, timeout=15)
+        else:
+            parsed = urlparse(record["url"])
+            query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+            query.update({k: str(v) for k, v in overrides.items()})
+            res = ur_http.get_session().get(parsed._replace(query=urlencode(query)).geturl(), timeout=15)
+        if res.status_code != 200:
+            return None
+        return res.json()
+    except Exception as e:
+        print(f"    ⚠️ 接口重放失败: {e}")
+        return None
+
+def serve_fixtures(directory, port=8765):
+    """本地桩服务器：按 方法 + 路径 + 请求体 返回录制的 JSON，用于离线调试"""
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8") if length else None
+            path = os.path.join(directory, fixture_key(method, self.path, body))
+            if not os.path.exists(path):
+                self.send_error(404, "fixture not recorded")
+                return
+            with open(path, encoding="utf-8") as f:
+                data = json.dumps(json.load(f)["payload"], ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self): self._reply("GET")
+        def do_POST(self): self._reply("POST")
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"🧪 fixture 服务器已启动: http://127.0.0.1:{port}/ ({directory})")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    # 用法: python ur_api.py serve <fixture 目录> [端口]
+    if len(sys.argv) >= 3 and sys.argv[1] == "serve":
+        serve_fixtures(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    else:
+        print("用法: python ur_api.py serve <fixture 目录> [端口]")
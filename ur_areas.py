@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from playwright.async_api import async_playwright
+from dotenv import load_dotenv
+import notion_client
+import ur_browser
+import metrics
+
+load_dotenv()
+
+# 地区并行方式: off - 逐个地区扫描; context - 每个地区一个 BrowserContext 并发; process - 每个地区一个进程
+AREA_PARALLEL = os.getenv("AREA_PARALLEL", "off")
+
+async def scan_areas(scan_area, areas):
+    """
+    按 AREA_PARALLEL 串行或并发调用 scan_area(browser, 地区)，返回 {地区: 结果 或异常}。
+    所有地区共用一个浏览器，每个 scan_area 自己创建并关闭 BrowserContext。
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=ur_browser.HEADLESS)
+        if AREA_PARALLEL == "context":
+            results = await asyncio.gather(*(scan_area(browser, a) for a in areas), return_exceptions=True)
+        else:
+            results = []
+            for area_code in areas:
+                try:
+                    results.append(await scan_area(browser, area_code))
+                except Exception as e:
+                    results.append(e)
+        await browser.close()
+        ur_browser.report_route_stats()
+        ur_browser.report_wait_stats()
+    return dict(zip(areas, results))
+
+def run_area_process(scan_area, area_code, existing_map, existing, writer):
+    """子进程中扫描单个地区：使用主进程传来的快照 existing，独立的浏览器和写入队列，失败时抛出异常"""
+    async def run():
+        existing_map.update(existing)
+        writer.start()
+        try:
+            result = (await scan_areas(scan_area, [area_code]))[area_code]
+        finally:
+            await writer.close()
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return asyncio.run(run())
+
+def _init_child(rate, burst):
+    # 各子进程平分 Notion 限速，合计不超过 NOTION_RATE (子进程运行期间主进程不写 Notion)
+    notion_client.limiter = notion_client.TokenBucket(rate, burst)
+
+def _run_child(process_entry, area_code, existing):
+    """子进程中执行 process_entry，连同本进程的指标一起返回 (失败时返回异常，指标照样带回)"""
+    try:
+        result = process_entry(area_code, existing)
+    except Exception as e:
+        result = e
+    return result, metrics.snapshot()
+
+async def scan_all(scan_area, areas, process_entry, existing=None):
+    """
+    扫描所有地区，返回 {地区: 结果 或异常}。
+    process 模式下每个地区在子进程中执行 process_entry(地区, existing)：子进程用 spawn 启动，不继承本进程的事件循环，
+    process_entry 必须是扫描器模块的顶层函数 (按名称导入)。existing 为主进程已同步好的快照，子进程不再各自同步。
+    """
+    if AREA_PARALLEL != "process":
+        return await scan_areas(scan_area, areas)
+    loop = asyncio.get_running_loop()
+    rate = notion_client.NOTION_RATE / len(areas)
+    burst = max(1, notion_client.NOTION_BURST // len(areas))
+    with ProcessPoolExecutor(max_workers=len(areas), mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_child, initargs=(rate, burst)) as pool:
+        outs = await asyncio.gather(*(loop.run_in_executor(pool, _run_child, process_entry, a, existing or {})
+                                      for a in areas), return_exceptions=True)
+    results = {}
+    for area_code, out in zip(areas, outs):
+        if isinstance(out, Exception):
+            results[area_code] = out
+            continue
+        results[area_code], child_metrics = out
+        metrics.merge(child_metrics)
+    return results
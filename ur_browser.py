@@ -0,0 +1,184 @@
+import asyncio
+import os
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# --- 请求拦截配置 ---
+# 需要拦截的资源类型 (Playwright resource_type)，逗号分隔。
+# 默认不拦截 stylesheet：没有 CSS 时 is_visible() 和 innerText 的结果会变 (隐藏的「次へ」被判定为可见)，
+# 扫描器依赖这两者判断翻页和读取卡片，确有需要时再显式加上
+BLOCK_RESOURCE_TYPES = {t.strip() for t in os.getenv("BLOCK_RESOURCE_TYPES", "image,font,media").split(",") if t.strip()}
+# 允许访问的域名 (含子域名)，其余第三方请求 (统计、广告、地图瓦片) 一律拦截
+ALLOW_DOMAINS = [d.strip() for d in os.getenv("ALLOW_DOMAINS", "ur-net.go.jp").split(",") if d.strip()]
+# 扫描器默认显示浏览器窗口便于观察，无显示器环境 (服务器、基准测试) 设为 1
+HEADLESS = os.getenv("HEADLESS", "0") == "1"
+
+# 本次运行的拦截统计 (所有 context 共用)
+route_stats = {
+    "blocked": Counter(),   # 按资源类型统计被拦截的请求数
+    "allowed": 0,           # 放行的请求数
+    "loaded_bytes": 0,      # 放行请求实际下载的字节数 (按 Content-Length)
+}
+
+def is_allowed_host(host):
+    return any(host == d or host.endswith("." + d) for d in ALLOW_DOMAINS)
+
+async def _route_handler(route):
+    req = route.request
+    parsed = urlparse(req.url)
+    # data: / blob: 等内联资源不走网络，直接放行
+    if parsed.scheme not in ("http", "https"):
+        await route.continue_()
+        return
+
+    if req.resource_type in BLOCK_RESOURCE_TYPES:
+        route_stats["blocked"][req.resource_type] += 1
+        await route.abort()
+    elif not is_allowed_host(parsed.hostname or ""):
+        route_stats["blocked"]["third_party"] += 1
+        await route.abort()
+    else:
+        route_stats["allowed"] += 1
+        await route.continue_()
+
+def _on_response(response):
+    length = response.headers.get("content-length")
+    if length and length.isdigit():
+        route_stats["loaded_bytes"] += int(length)
+
+async def new_context(browser, **kwargs):
+    """创建带请求拦截的 BrowserContext，参数与 browser.new_context 相同"""
+    context = await browser.new_context(**kwargs)
+    await context.route("**/*", _route_handler)
+    context.on("response", _on_response)
+    return context
+
+def report_route_stats():
+    blocked = route_stats["blocked"]
+    detail = ", ".join(f"{k}={v}" for k, v in blocked.most_common()) or "无"
+    print(f"🛡️ 请求拦截统计: 拦截 {sum(blocked.values())} 个 ({detail})，"
+          f"放行 {route_stats['allowed']} 个，共下载 {route_stats['loaded_bytes'] / 1024 / 1024:.1f} MB")
+
+# --- 事件驱动等待 ---
+# 每类等待: 原固定等待总时长 / 实际等待总时长 / 次数，用于统计节省的时间
+wait_stats = defaultdict(lambda: {"fixed_ms": 0, "actual_ms": 0, "count": 0})
+
+def _record_wait(name, fixed_ms, started):
+    elapsed = time.monotonic() - started
+    stat = wait_stats[name]
+    stat["fixed_ms"] += fixed_ms
+    stat["actual_ms"] += elapsed * 1000
+    stat["count"] += 1
+    metrics.observe("wait", elapsed, kind=name)
+
+# --- 带计时的导航 / 选择器等待 ---
+# stage 用于区分页面类型 (area / result / room / map / danchi ...)，对应指标的 stage 标签
+
+async def goto(page, url, stage, **kwargs):
+    """page.goto 并按 stage 计时，参数与 page.goto 相同"""
+    with metrics.timer("goto", stage=stage):
+        return await page.goto(url, **kwargs)
+
+async def wait_for_selector(page, selector, stage, **kwargs):
+    """page.wait_for_selector 并按 stage 计时，超时照常抛出异常"""
+    with metrics.timer("wait_for_selector", stage=stage):
+        return await page.wait_for_selector(selector, **kwargs)
+
+def _is_xhr(response):
+    return response.request.resource_type in ("xhr", "fetch")
+
+async def act_and_wait_response(page, action, fixed_ms, predicate=_is_xhr, name="settle"):
+    """
+    代替操作后的固定等待：执行 action() 并等待它触发的第一个匹配的响应 (默认任意 XHR/fetch)，最多等 fixed_ms。
+    监听在 action 之前注册，不会错过操作立即发出的请求；action 自身的异常照常抛出。
+    """
+    started = time.monotonic()
+    acted = False
+    try:
+        async with page.expect_response(predicate, timeout=fixed_ms):
+            await action()
+            acted = True
+    except Exception:
+        if not acted:
+            raise
+    _record_wait(name, fixed_ms, started)
+
+async def list_signature(page, signature_js):
+    """signature_js 为返回字符串的 JS 函数，用于判断结果列表是否已经换页"""
+    return await page.evaluate(signature_js)
+
+async def wait_for_list_change(page, signature_js, old_signature, fixed_ms, timeout_ms=None, name="list_change"):
+    """
+    代替翻页后的固定等待：列表签名与 old_signature 不同 (且非空) 时立即返回。
+    fixed_ms 为原来的固定等待，只用于统计；最多等 timeout_ms (默认同 fixed_ms)，仍未变化则抛出超时异常，
+    调用方不能把加载缓慢的下一页当成最后一页。
+    """
+    started = time.monotonic()
+    try:
+        await page.wait_for_function(
+            f"(old) => {{ const sig = ({signature_js})(); return !!sig && sig !== old; }}",
+            arg=old_signature, timeout=timeout_ms or fixed_ms,
+        )
+    finally:
+        _record_wait(name, fixed_ms, started)
+
+async def wait_for_selector_within(page, selector, fixed_ms, name="selector"):
+    """代替固定等待：选择器出现即返回，最多等 fixed_ms"""
+    started = time.monotonic()
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=fixed_ms)
+    except Exception:
+        pass
+    _record_wait(name, fixed_ms, started)
+
+async def wait_for_stable(page, signature_js, fixed_ms, interval_ms=100, name="stable"):
+    """代替渲染缓冲：连续两次采样的签名相同即视为渲染完成，最多等 fixed_ms"""
+    started = time.monotonic()
+    last = await page.evaluate(signature_js)
+    while (time.monotonic() - started) * 1000 < fixed_ms:
+        await asyncio.sleep(interval_ms / 1000)
+        current = await page.evaluate(signature_js)
+        if current == last:
+            break
+        last = current
+    _record_wait(name, fixed_ms, started)
+
+class Politeness:
+    """
+    礼貌限速：两次请求之间至少间隔 interval 秒，与 Notion 限速相互独立。
+    只补足距离上次请求的剩余时间，抓取本身耗费的时间不再重复等待。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self, name="politeness"):
+        async with self.lock:
+            started = time.monotonic()
+            delay = self.last + self.interval - started
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last = time.monotonic()
+        _record_wait(name, self.interval * 1000, started)
+
+def politeness_interval(default):
+    """POLITENESS_INTERVAL 环境变量可统一覆盖各脚本的默认请求间隔 (秒)"""
+    value = os.getenv("POLITENESS_INTERVAL")
+    return float(value) if value else default
+
+def report_wait_stats():
+    if not wait_stats:
+        return
+    fixed = sum(s["fixed_ms"] for s in wait_stats.values())
+    actual = sum(s["actual_ms"] for s in wait_stats.values())
+    detail = ", ".join(f"{k}: {s['count']} 次 省 {(s['fixed_ms'] - s['actual_ms']) / 1000:.1f}s"
+                       for k, s in wait_stats.items())
+    print(f"⏱️ 等待统计: 固定等待需 {fixed / 1000:.1f}s，实际 {actual / 1000:.1f}s，"
+          f"节省 {(fixed - actual) / 1000:.1f}s ({detail})")
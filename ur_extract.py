@@ -0,0 +1,210 @@
+import re
+import metrics
+
+# lxml 为可选依赖：未安装时 extract_html 返回 None，调用方回退到 Playwright
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# --- 声明式抽取规则 ---
+# 字段 -> {
+#   selector:   CSS 选择器或列表 (按顺序取第一个匹配的元素)，只支持 tag.cls 与空格 (后代) 组合
+#   attr:       读取属性值，不填则取文本
+#   first_line: 只取文本的第一行
+#   rows:       ["th", "td"]：selector 匹配到的每一行取这些直接子元素的文本，返回行列表
+#   sub:        [(正则, 替换)]，依次替换
+#   regex:      替换后取第一个匹配 (有分组时取第 1 组)
+#   digits:     拼接所有数字转为 int
+#   default:    元素不存在、文本为空或正则不匹配时的值
+# }
+# 浏览器端在一次 page.evaluate 中读取所有原始文本，HTML 端用 lxml 读取同样的文本，后处理共用 finish()
+
+# 房间页、团地页和地图页共用的坐标字段
+COORDS_SPEC = {
+    "lat": {"selector": ".js-lat-data", "attr": "value"},
+    "lng": {"selector": ".js-lng-data", "attr": "value"},
+}
+
+ROOM_SPEC = {
+    "price": {"selector": ".roomprice_body_emphasis", "digits": True},
+    "area_name": {"selector": ".item_subtitle", "first_line": True, "sub": [(r'\(.*?\).*', '')], "default": "UR"},
+    "room_no": {"selector": [".item_title.rep_room-nm", ".item_title"], "sub": [('最近見た部屋', '')]},
+    "fee": {"selector": [".roomprice_item", "li.roomprice", ".roomprice_body"], "sub": [(',', '')],
+            "regex": r'\((\d+)円\)', "digits": True, "default": 0},
+    "layout_size": {"selector": ".rep_madori-yuka"},
+    "floor": {"selector": ".rep_kai"},
+    "years": {"selector": ".rep_years"},
+    **COORDS_SPEC,
+}
+
+DANCHI_SPEC = {
+    # 忽略 rt 注音：有 ruby 时取其中的 span，否则取标题第一行
+    "name": {"selector": ["h1.article_headings ruby span", "h1.article_headings"], "first_line": True},
+    **COORDS_SPEC,
+}
+
+# 由 JS 填充的文本字段：原始 HTML 中只有空占位，HTTP 路径缺任何一个都交给浏览器，浏览器路径仍缺时用这些默认值
+ROOM_TEXT_DEFAULTS = {"room_no": "", "layout_size": "", "floor": "未知", "years": "未知"}
+
+SLIDERS_SPEC = {
+    "rows": {"selector": "div.article_sliders_table tr", "rows": ["th", "td"]},
+}
+
+EXTRACT_JS = """(spec) => {
+    const out = {};
+    for (const [field, f] of Object.entries(spec)) {
+        if (f.rows) {
+            const rows = [];
+            document.querySelectorAll(f.selector[0]).forEach(tr => {
+                const cells = f.rows.map(c => {
+                    const el = Array.from(tr.children).find(x => x.matches(c));
+                    return el ? el.innerText : null;
+                });
+                if (cells.every(c => c !== null)) rows.push(cells);
+            });
+            out[field] = rows;
+            continue;
+        }
+        let el = null;
+        for (const s of f.selector) {
+            el = document.querySelector(s);
+            if (el) break;
+        }
+        if (!el) { out[field] = null; continue; }
+        let v = f.attr ? el.getAttribute(f.attr) : el.innerText;
+        if (v !== null && f.first_line) v = v.split("\\n")[0];
+        out[field] = v;
+    }
+    return out;
+}"""
+
+def _selectors(value):
+    return [value] if isinstance(value, str) else list(value)
+
+def js_spec(spec):
+    """只把浏览器端需要的部分传给 page.evaluate"""
+    return {field: {"selector": _selectors(f["selector"]), "attr": f.get("attr"),
+                    "first_line": f.get("first_line", False), "rows": f.get("rows")}
+            for field, f in spec.items()}
+
+def _finish_value(f, value):
+    if value is None:
+        return f.get("default")
+    value = value.strip()
+    for pattern, repl in f.get("sub", []):
+        value = re.sub(pattern, repl, value).strip()
+    # JS 渲染前的空占位与元素不存在同等对待
+    if not value:
+        return f.get("default")
+    if "regex" in f:
+        m = re.search(f["regex"], value)
+        if not m:
+            return f.get("default")
+        value = m.group(1) if m.groups() else m.group(0)
+    if f.get("digits"):
+        digits = re.findall(r'\d+', value)
+        return int(''.join(digits)) if digits else f.get("default")
+    return value
+
+def finish(spec, raw):
+    """原始文本 -> 字段值 (两端共用的后处理)"""
+    out = {}
+    for field, f in spec.items():
+        value = raw.get(field)
+        if f.get("rows"):
+            out[field] = [tuple(c.replace("\n", "").strip() for c in cells) for cells in (value or [])]
+        else:
+            out[field] = _finish_value(f, value)
+    return out
+
+async def extract(page, spec):
+    """在浏览器中用一次 page.evaluate 读取 spec 中的所有字段"""
+    with metrics.timer("extract", source="browser"):
+        return finish(spec, await page.evaluate(EXTRACT_JS, js_spec(spec)))
+
+def _css_to_xpath(selector):
+    """把 'div.a.b tr' 这类简单选择器转换为 XPath"""
+    parts = []
+    for compound in selector.split():
+        m = re.fullmatch(r'([\w*-]*)((?:\.[\w-]+)*)', compound)
+        if not m:
+            raise ValueError(f"不支持的选择器: {selector}")
+        tag = m.group(1) or "*"
+        conds = "".join(f"[contains(concat(' ', normalize-space(@class), ' '), ' {c} ')]"
+                        for c in m.group(2).split(".") if c)
+        parts.append(f"{tag}{conds}")
+    return "//" + "//".join(parts)
+
+def _first_line(el):
+    """近似浏览器 innerText.split('\\n')[0]：取第一个非空文本片段，片段内的空白像 innerText 一样折叠为空格"""
+    for chunk in el.itertext():
+        if chunk.strip():
+            return " ".join(chunk.split())
+    return ""
+
+def extract_html(html, spec):
+    """用同一份 spec 解析原始 HTML；lxml 未安装或 HTML 无法解析时返回 None"""
+    if lxml_html is None or not html:
+        return None
+    with metrics.timer("extract", source="html"):
+        return _extract_html(html, spec)
+
+def _extract_html(html, spec):
+    try:
+        doc = lxml_html.fromstring(html)
+    except Exception:
+        return None
+
+    raw = {}
+    for field, f in spec.items():
+        selectors = _selectors(f["selector"])
+        if f.get("rows"):
+            rows = []
+            for tr in doc.xpath(_css_to_xpath(selectors[0])):
+                cells = []
+                for c in f["rows"]:
+                    found = tr.xpath(_css_to_xpath(c).replace("//", "./", 1))
+                    cells.append(found[0].text_content() if found else None)
+                if all(c is not None for c in cells):
+                    rows.append(cells)
+            raw[field] = rows
+            continue
+        el = None
+        for s in selectors:
+            found = doc.xpath(_css_to_xpath(s))
+            if found:
+                el = found[0]
+                break
+        if el is None:
+            raw[field] = None
+        elif f.get("attr"):
+            raw[field] = el.get(f["attr"])
+        else:
+            raw[field] = _first_line(el) if f.get("first_line") else el.text_content()
+    return finish(spec, raw)
+
+def room_from_fields(fields, strict=False):
+    """
+    ROOM_SPEC 的结果 -> 房间字典 (与 ur_http.parse_room_html 的返回结构一致)，没有租金返回 None。
+    strict=True (HTTP 路径) 时 ROOM_TEXT_DEFAULTS 中任一字段缺失也返回 None，否则缺失字段用默认值。
+    """
+    if fields is None or fields["price"] is None:
+        return None
+    if strict and any(fields[k] is None for k in ROOM_TEXT_DEFAULTS):
+        return None
+    room = {k: fields[k] for k in ("price", "fee", "area_name")}
+    room.update({k: fields[k] if fields[k] is not None else d for k, d in ROOM_TEXT_DEFAULTS.items()})
+    room["coords"] = coords_from_fields(fields)
+    return room
+
+def coords_from_fields(fields):
+    """COORDS_SPEC 的结果 -> {"lat", "lng"}，缺任何一个返回 None"""
+    lat, lng = fields["lat"], fields["lng"]
+    return {"lat": lat, "lng": lng} if lat and lng else None
+
+def danchi_from_fields(fields):
+    """DANCHI_SPEC 的结果 -> {"name", "coords"}；name 为 None 表示标题不存在或尚未渲染"""
+    if fields is None:
+        return None
+    return {"name": fields["name"], "coords": coords_from_fields(fields)}
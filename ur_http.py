@@ -0,0 +1,85 @@
+import os
+import re
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import ur_extract
+import metrics
+
+# lxml 为可选依赖：未安装时所有解析函数返回 None，调用方自动回退到 Playwright
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+load_dotenv()
+
+# UR 站点根地址，基准测试时指向本地桩服务器
+UR_BASE = os.getenv("UR_BASE_URL", "https://www.ur-net.go.jp").rstrip("/")
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+POOL_SIZE = 16
+
+_session = None
+
+def get_session():
+    """全局复用一个带连接池的 Session，保持 keep-alive"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "ja,en;q=0.8"})
+    return _session
+
+def fetch_html(url, timeout=15):
+    """直接拉取原始 HTML，失败返回 None"""
+    if lxml_html is None:
+        return None
+    try:
+        with metrics.timer("http_fetch"):
+            res = get_session().get(url, timeout=timeout)
+        if res.status_code != 200:
+            metrics.incr("http_fetch_errors", status=res.status_code)
+            return None
+        if not res.encoding or res.encoding.lower() == "iso-8859-1":
+            res.encoding = res.apparent_encoding
+        return res.text
+    except Exception as e:
+        print(f"    ⚠️ HTTP 抓取异常 {url}: {e}")
+        return None
+
+def danchi_id_from_url(url):
+    """从团地 / 房间 / 地图页 URL 中取出团地 ID，例如 .../40_0520_room.html -> 40_0520"""
+    m = re.search(r'/(\d+_\d+)(?:_[a-z_]+)?\.html$', urlparse(url).path)
+    return m.group(1) if m else None
+
+def parse_coords(html):
+    """从房间页 / 地图页提取坐标 (规则见 ur_extract.COORDS_SPEC)，找不到返回 None"""
+    fields = ur_extract.extract_html(html, ur_extract.COORDS_SPEC)
+    return ur_extract.coords_from_fields(fields) if fields else None
+
+def parse_room_html(html):
+    """
+    解析房间详情页的静态字段 (规则见 ur_extract.ROOM_SPEC，与浏览器回退路径共用)。
+    租金和 ur_extract.ROOM_TEXT_DEFAULTS 中的文本字段是必需的，原始 HTML 中缺失 (或只有空占位)
+    说明需要 JS 渲染，返回 None 交给浏览器。坐标可能缺失 (coords=None)，由调用方决定是否去地图页。
+    """
+    return ur_extract.room_from_fields(ur_extract.extract_html(html, ur_extract.ROOM_SPEC), strict=True)
+
+def parse_danchi_html(html):
+    """
+    解析团地页的名称 (忽略 rt 注音) 和坐标，规则见 ur_extract.DANCHI_SPEC (与浏览器回退路径共用)。
+    找不到名称 (标题缺失或需要 JS 渲染) 返回 None。
+    """
+    danchi = ur_extract.danchi_from_fields(ur_extract.extract_html(html, ur_extract.DANCHI_SPEC))
+    return danchi if danchi and danchi["name"] else None
+
+def parse_sliders_rows(html):
+    """
+    提取 div.article_sliders_table 中每一行的 (th, td) 文本。
+    表格不在原始 HTML 中时返回 None。
+    """
+    fields = ur_extract.extract_html(html, ur_extract.SLIDERS_SPEC)
+    return (fields["rows"] or None) if fields else None
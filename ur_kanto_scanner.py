@@ -1,107 +1,111 @@
 import asyncio
-from playwright.async_api import async_playwright
-import re
-import requests
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from notion_client import parse_notion_time
+from notion_writer import NotionWriter
+import ur_http
+import ur_extract
+import ur_browser
+import ur_api
+import ur_pagination
+import ur_areas
+import local_store
+import metrics
 
 load_dotenv()
 
 # --- 配置 (请确保 token 和 ID 正确) ---
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID = os.getenv("DATABASE_ID")
 MAX_PRICE = 160000
 AREAS = ["tokyo", "kanagawa", "chiba"]
-
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
+# 并发抓取详情页的 page 数量 (每个 context 建议 4~8)
+DETAIL_WORKERS = int(os.getenv("DETAIL_WORKERS", "4"))
+# 先用纯 HTTP 解析详情页，缺字段再回退浏览器 (设为 0 则总是用浏览器)
+HTTP_FAST_PATH = os.getenv("HTTP_FAST_PATH", "1") == "1"
+# 无变动房源的「更新时间」心跳策略:
+#   sweep  - 只在本地记录存活，运行结束后对超过 HEARTBEAT_INTERVAL_HOURS 未刷新的房源批量补一次 (默认)
+#   local  - 只在本地记录存活，从不为心跳写 Notion
+#   always - 旧行为，每个无变动房源都 PATCH 一次 (DELTA_CRAWL 跳过详情页的房源在运行结束时补写)
+HEARTBEAT_MODE = os.getenv("HEARTBEAT_MODE", "sweep")
+HEARTBEAT_INTERVAL_HOURS = float(os.getenv("HEARTBEAT_INTERVAL_HOURS", "24"))
+# 从结果页直接读取租金，与本地快照一致的房源不再打开详情页 (设为 0 则全部访问详情页)
+DELTA_CRAWL = os.getenv("DELTA_CRAWL", "1") == "1"
+# 监听结果页后台的 JSON 接口，直接从接口数据解析房间列表 (解析不到时回退读 DOM)
+CAPTURE_XHR = os.getenv("CAPTURE_XHR", "0") == "1"
+# 结果列表签名：翻页后签名变化即说明新一页已渲染
+ROOM_LIST_SIGNATURE = """() => Array.from(document.querySelectorAll("a"))
+    .filter(a => a.innerText.includes("部屋詳細")).map(a => a.href).join("|")"""
 
 # 全局变量：用于存储数据库现有房源，实现加速比对和下架检测
 # 格式: { "url": {"page_id": "xxx", "price": 123} }
+# 多个 worker 共享此 Map：写入结果由 writer 回调在事件循环中同步更新，不会出现交错
 existing_pages_map = {}
+# main 中启动的快照同步任务，为 None 表示已同步 (或由调用方自行同步)
+existing_sync = None
+# Notion 写入队列：抓取协程只投递，不等待写入完成
+writer = NotionWriter()
+# 本次运行中无变动的房源，运行结束时按心跳策略统一处理
+unchanged_urls = set()
 
-def call_notion_api(method, url, data=None):
-    try:
-        if method == "POST":
-            response = requests.post(url, headers=HEADERS, json=data)
-        elif method == "PATCH":
-            response = requests.patch(url, headers=HEADERS, json=data)
-        
-        if response.status_code not in [200, 201]:
-            print(f"❌ Notion API 错误 ({response.status_code}): {response.text}")
-            return None
-        return response.json()
-    except Exception as e:
-        print(f"❌ 网络请求异常: {e}")
-        return None
+def parse_existing_page(page):
+    """Notion 页面 -> (url, 本地快照)，没有链接的页面返回 None"""
+    url_prop = page["properties"].get("链接", {}).get("url")
+    if not url_prop: return None
+    price_prop = page["properties"].get("租金", {}).get("number")
+    name_list = page["properties"].get("房源名称", {}).get("title", [])
+    name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
+    status_prop = page["properties"].get("房屋状态", {}).get("status", {}).get("name") 
+    updated_prop = (page["properties"].get("更新时间", {}).get("date") or {}).get("start")
+    return url_prop, {
+        "page_id": page["id"],
+        "price": price_prop,
+        "name": name_text,
+        "status": status_prop,
+        "updated": updated_prop
+    }
 
 async def fetch_all_existing_pages():
-    """程序启动时，一次性获取数据库所有房源的 URL 和价格"""
+    """程序启动时，从本地镜像库读取现有数据 (只向 Notion 增量同步有变动的页面)"""
     global existing_pages_map
     print("📡 正在同步 Notion 数据库现状...")
-    query_url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    
-    has_more = True
-    next_cursor = None
-    
-    while has_more:
-        payload = {"page_size": 100}
-        if next_cursor:
-            payload["start_cursor"] = next_cursor
-            
-        res = call_notion_api("POST", query_url, payload)
-        if not res: break
-        
-        for page in res.get("results", []):
-            url_prop = page["properties"].get("链接", {}).get("url")
-            price_prop = page["properties"].get("租金", {}).get("number")
-            name_list = page["properties"].get("房源名称", {}).get("title", [])
-            name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
-            status_prop = page["properties"].get("房屋状态", {}).get("status", {}).get("name") 
-
-            if url_prop:
-                existing_pages_map[url_prop] = {
-                    "page_id": page["id"],
-                    "price": price_prop,
-                    "name": name_text,
-                    "status": status_prop
-                }
-        
-        has_more = res.get("has_more")
-        next_cursor = res.get("next_cursor")
-    
+    existing_pages_map.update(await asyncio.to_thread(local_store.load_existing_pages, DATABASE_ID, parse_existing_page))
     print(f"✅ 同步完成，库中现有 {len(existing_pages_map)} 条房源。")
 
+async def get_coords(p):
+    """浏览器端读取坐标，规则与 ur_http.parse_coords 共用"""
+    return ur_extract.coords_from_fields(await ur_extract.extract(p, ur_extract.COORDS_SPEC))
+
+async def read_room_fields(page):
+    """浏览器回退路径：一次 page.evaluate 读取已渲染详情页的全部字段，规则与 ur_http.parse_room_html 共用"""
+    return ur_extract.room_from_fields(await ur_extract.extract(page, ur_extract.ROOM_SPEC))
+
 async def scrape_room_details(page, detail_url, seen_urls):
     """
     seen_urls: 本次爬虫运行中见到的所有 URL 集合
+    优先走纯 HTTP 解析，原始 HTML 中缺少租金等字段时才用浏览器渲染
     """
     try:
         seen_urls.add(detail_url) # 记录此 URL 依然存活
-        
-        await page.goto(detail_url, wait_until="domcontentloaded")
-        await page.wait_for_selector(".roomprice_body_emphasis", timeout=10000)
-        
-        rent_text = await page.eval_on_selector(".roomprice_body_emphasis", "el => el.innerText")
-        current_price = int(''.join(re.findall(r'\d+', rent_text)))
+
+        room = None
+        if HTTP_FAST_PATH:
+            html = await asyncio.to_thread(ur_http.fetch_html, detail_url)
+            room = ur_http.parse_room_html(html)
+
+        if room is None:
+            metrics.incr("browser_fallback", stage="room")
+            await ur_browser.goto(page, detail_url, "room", wait_until="domcontentloaded")
+            await ur_browser.wait_for_selector(page, ".roomprice_body_emphasis", "room", timeout=10000)
+            room = await read_room_fields(page)
+        current_price = room["price"]
         
         if current_price > MAX_PRICE:
             return False
-        
-        async def get_coords(p):
-            return await p.evaluate('''() => {
-                const latEl = document.querySelector(".js-lat-data");
-                const lngEl = document.querySelector(".js-lng-data");
-                return latEl && lngEl ? { lat: latEl.value, lng: lngEl.value } : null;
-            }''')
-
-        coords = await get_coords(page)
 
-        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        # 带时区偏移：不带偏移的时间会被 Notion 当作 UTC，读回后偏差一个时区
+        now = datetime.now().astimezone().isoformat(timespec="seconds")
 
         # --- 核心逻辑：使用本地 Map 进行比对 ---
         if detail_url in existing_pages_map:
@@ -127,54 +131,64 @@ async def scrape_room_details(page, detail_url, seen_urls):
                 # 确保包含更新时间
                 if "更新时间" not in update_properties:
                     update_properties["更新时间"] = {"date": {"start": now}}
-                call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{page_id}", {"properties": update_properties})
-            else:
+
+                def on_updated(res, page_info=page_info, price=current_price, now=now):
+                    if res:
+                        page_info["price"] = price
+                        page_info["status"] = "空室可租"
+                        page_info["updated"] = now
+                writer.patch(page_id, update_properties, on_updated)
+            elif HEARTBEAT_MODE == "always":
                 # 无变动，仅静默更新活跃时间
-                call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{page_id}", 
-                                {"properties": {"更新时间": {"date": {"start": now}}}})
+                writer.patch(page_id, {"更新时间": {"date": {"start": now}}})
+                print(f"    😴 [保持现状]: {existing_name}")
+            else:
+                # 无变动：存活情况只记在本地，结束时统一决定是否补写更新时间
+                unchanged_urls.add(detail_url)
                 print(f"    😴 [保持现状]: {existing_name}")
             
             return True
 
         # --- 新房源逻辑 ---
-        # (字段抓取逻辑保持不变...)
-        area_el = await page.query_selector(".item_subtitle")
-        area_name = re.sub(r'\(.*?\).*', '', (await area_el.inner_text()).split('\n')[0]).strip() if area_el else "UR"
-        room_el = await page.query_selector(".item_title.rep_room-nm") or await page.query_selector(".item_title")
-        room_no = (await room_el.inner_text()).replace('最近見た部屋', '').strip() if room_el else ""
-        full_title = f"{area_name} {room_no}".strip()
-
-        price_area = await page.locator(".roomprice_item, li.roomprice, .roomprice_body").first.inner_text()
-        fee_match = re.search(r'\((\d+,?\d+)円\)', price_area)
-        fee = int(fee_match.group(1).replace(',', '')) if fee_match else 0
-        
-        layout_size_el = await page.query_selector(".rep_madori-yuka")
-        layout_size_text = (await layout_size_el.inner_text()).strip() if layout_size_el else ""
+        coords = room["coords"]
+        full_title = f"{room['area_name']} {room['room_no']}".strip()
+        fee = room["fee"]
+
+        layout_size_text = room["layout_size"]
         room_type, size_text = ("待确认", "未知")
         if "/" in layout_size_text:
             parts = layout_size_text.split("/")
             room_type, size_text = parts[0].strip(), parts[1].strip()
 
-        floor_el = await page.query_selector(".rep_kai")
-        floor_text = (await floor_el.inner_text()).strip() if floor_el else "未知"
-        years_el = await page.query_selector(".rep_years")
-        years_text = (await years_el.inner_text()).strip() if years_el else "未知"
+        floor_text = room["floor"]
+        years_text = room["years"]
 
-        if not coords:
-            map_url = detail_url.replace("_room.html", "_room_map.html")
-            print(f"    🔄 主页未找到坐标，尝试跳转地图页: {map_url}")
-            await page.goto(map_url, wait_until="domcontentloaded")
-            # 在地图页给一点缓冲时间
-            await page.wait_for_timeout(1000)
-            coords = await get_coords(page)
+        # 同一团地的房间坐标相同：先查团地坐标缓存，未命中才去地图页
+        danchi_id = ur_http.danchi_id_from_url(detail_url)
+        if coords:
+            local_store.save_coords(danchi_id, coords)
+        else:
+            cached, coords = local_store.lookup_coords(danchi_id)
+            if not cached:
+                map_url = detail_url.replace("_room.html", "_room_map.html")
+                print(f"    🔄 主页未找到坐标，尝试跳转地图页: {map_url}")
+                if HTTP_FAST_PATH:
+                    coords = ur_http.parse_coords(await asyncio.to_thread(ur_http.fetch_html, map_url))
+                if not coords:
+                    await ur_browser.goto(page, map_url, "map", wait_until="domcontentloaded")
+                    # 坐标标签出现即返回，最多等 1 秒
+                    await ur_browser.wait_for_selector_within(page, ".js-lat-data", 1000, name="map_coords")
+                    coords = await get_coords(page)
+                local_store.save_coords(danchi_id, coords)
 
         if coords:
             lat_num = float(coords['lat'])
             lng_num = float(coords['lng'])
             print(f"    📍 坐标抓取成功: {lat_num}, {lng_num}")
         else:
+            # 坐标未知时留空，不写 0.0 以免被当成有效坐标参与通勤计算
             print(f"    ⚠️ 最终未能找到坐标标签")
-            lat_num, lng_num = 0.0, 0.0
+            lat_num, lng_num = None, None
 
         props = {
             "房源名称": {"title": [{"text": {"content": full_title}}]},
@@ -193,81 +207,221 @@ async def scrape_room_details(page, detail_url, seen_urls):
             "房屋状态": {"status": {"name": "空室可租"}},
         }
         
-        if call_notion_api("POST", "https://api.notion.com/v1/pages", {"parent": {"database_id": DATABASE_ID}, "properties": props}):
+        def on_created(res):
+            if not res: return
+            # 写回本地快照，同一 URL 再次出现时走更新逻辑而不是重复新建
+            existing_pages_map[detail_url] = {
+                "page_id": res["id"],
+                "price": current_price,
+                "name": full_title,
+                "status": "空室可租",
+                "updated": now
+            }
             print(f"    ✨ [新录入]: {full_title}")
-            return True
+        writer.create(DATABASE_ID, props, on_created)
+        return True
             
     except Exception as e:
         print(f"    ⚠️ 抓取失败: {e}")
     return False
 
-async def main():
-    # 1. 初始化数据库快照
-    await fetch_all_existing_pages()
-    
-    # 本次见到的所有 URL 集合
+def sweep_heartbeats(seen_urls):
+    """
+    对本次无变动、但 Notion 上更新时间已过期的房源批量补写一次更新时间。
+    always 模式下不看是否过期：结果页上租金未变、没有打开详情页的房源也要各写一次心跳。
+    """
+    now_dt = datetime.now()
+    now = now_dt.astimezone().isoformat(timespec="seconds")
+    local_store.record_seen(DATABASE_ID, seen_urls, now)
+    if HEARTBEAT_MODE not in ("sweep", "always"):
+        return 0
+
+    threshold = now_dt - timedelta(hours=HEARTBEAT_INTERVAL_HOURS)
+    count = 0
+    for url in unchanged_urls:
+        info = existing_pages_map.get(url)
+        if not info: continue
+        updated = parse_notion_time(info.get("updated"))
+        if HEARTBEAT_MODE == "sweep" and updated and updated > threshold: continue
+        writer.patch(info["page_id"], {"更新时间": {"date": {"start": now}}})
+        info["updated"] = now
+        count += 1
+    return count
+
+async def read_result_cards(page):
+    """一次 evaluate 读取结果页上每个房间的详情链接 (完整 URL) 和租金 (解析不到时为 None)"""
+    return await page.evaluate('''() => {
+        const cards = [];
+        document.querySelectorAll("a").forEach(a => {
+            if (!a.innerText.includes("部屋詳細")) return;
+            const row = a.closest("tr, li, .js-log-item") || a.parentElement;
+            const m = row ? row.innerText.match(/([\\d,]+)円/) : null;
+            cards.push({ href: a.href, price: m ? parseInt(m[1].replace(/,/g, ""), 10) : null });
+        });
+        return cards;
+    }''')
+
+def is_unchanged(detail_url, price):
+    """结果页上的租金与本地快照一致，且房源未被标记下线"""
+    info = existing_pages_map.get(detail_url)
+    return bool(info) and price is not None and info.get("price") == price and info.get("status") != "已下线"
+
+async def detail_worker(context, queue, seen_urls):
+    """从队列中持续取出房间 URL 抓取，每个 worker 独占一个 page"""
+    page = await context.new_page()
+    try:
+        while True:
+            link = await queue.get()
+            try:
+                await scrape_room_details(page, link, seen_urls)
+            finally:
+                queue.task_done()
+    finally:
+        await page.close()
+
+async def scan_area(browser, area_code):
+    """在独立的 BrowserContext 中扫描一个地区，返回 (本地区见到的 URL 集合, 耗时秒数)"""
+    started = time.monotonic()
     seen_urls = set()
+    context = await ur_browser.new_context(browser)
+    page = await context.new_page()
+    capture = None
+    if CAPTURE_XHR:
+        capture = ur_api.SearchCapture()
+        capture.attach(page)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        for area_code in AREAS:
-            print(f"\n🌍 === 正在开始抓取地区: {area_code.upper()} ===")
-            await page.goto(f"https://www.ur-net.go.jp/chintai/kanto/{area_code}/area/")
-            await page.evaluate("""() => {
-                document.querySelectorAll("input[type='checkbox']:not(:disabled)").forEach(b => {
-                    b.checked = true;
-                    b.dispatchEvent(new Event('change', { bubbles: true }));
-                });
-            }""")
-            await page.wait_for_timeout(2000)
-            await page.goto(f"https://www.ur-net.go.jp/chintai/kanto/{area_code}/result/")
-
-            page_num = 1
-            while True:
-                print(f"--- 📄 {area_code.upper()} 正在扫描第 {page_num} 页 ---")
-                try:
-                    await page.wait_for_selector("a:has-text('部屋詳細')", timeout=15000)
-                except:
-                    break
-
-                links = [f"https://www.ur-net.go.jp{await btn.get_attribute('href')}" 
-                         for btn in await page.query_selector_all("a:has-text('部屋詳細')")]
-                
-                detail_page = await context.new_page()
-                for link in links:
-                    await scrape_room_details(detail_page, link, seen_urls)
-                await detail_page.close()
-
-                # 翻页逻辑
-                next_btn = await page.query_selector("li.next a, a:has-text('次へ')")
-                if next_btn and await next_btn.is_visible():
-                    page_num += 1
-                    await next_btn.click()
-                    await page.wait_for_timeout(4000)
-                else: break
-
-        await browser.close()
-
-    # 3. 标记下架房源
-    print("\n🧹 正在检查并更新已下架房源状态...")
-    deleted_count = 0
-    for url, info in existing_pages_map.items():
-        if url not in seen_urls and info.get("status") != "已下线":
-            # 该房源在数据库里有，但本次遍历网页没抓到 -> 说明已下架
-            # 不再删除，而是将“我的状态”更新为“已下线”
-            update_data = {
-                "properties": {
-                    "房屋状态": {"status": {"name": "已下线"}}
-                }
-            }
-            # 如果你希望同时清空租金或者更新时间，可以在这里添加
-            call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{info['page_id']}", update_data)
-            deleted_count += 1
-            print(f"    💤 [房源下线]: {info['name']} ({url})")
-    
+    # 详情页 worker 池：翻页的同时不断往队列里投递链接
+    queue = asyncio.Queue(maxsize=DETAIL_WORKERS * 10)
+    queued_urls = set()
+    delta_skipped = 0
+    workers = [asyncio.create_task(detail_worker(context, queue, seen_urls))
+               for _ in range(DETAIL_WORKERS)]
+
+    async def enqueue(cards):
+        nonlocal delta_skipped
+        if existing_sync:
+            await existing_sync
+        for card in cards:
+            link = card["href"]
+            if link in queued_urls: continue
+            queued_urls.add(link)
+            if DELTA_CRAWL and card["price"] is not None:
+                if is_unchanged(link, card["price"]):
+                    # 价格未变：只记为存活，不访问详情页
+                    seen_urls.add(link)
+                    unchanged_urls.add(link)
+                    delta_skipped += 1
+                    continue
+                if card["price"] > MAX_PRICE:
+                    seen_urls.add(link)
+                    delta_skipped += 1
+                    continue
+            await queue.put(link)
+
+    async def read_cards(p):
+        """主结果页优先用接口数据，解析不到时读 DOM"""
+        if capture:
+            cards = [room for payload in await capture.take() for room in ur_api.extract_rooms(payload)]
+            if cards:
+                return cards
+        return await read_result_cards(p)
+
+    try:
+        print(f"\n🌍 === 正在开始抓取地区: {area_code.upper()} ===")
+        await ur_browser.goto(page, f"{ur_http.UR_BASE}/chintai/kanto/{area_code}/area/", "area")
+        # 勾选触发的 change 事件会发请求保存条件，等该请求返回后再进入结果页
+        await ur_browser.act_and_wait_response(page, lambda: page.evaluate("""() => {
+            document.querySelectorAll("input[type='checkbox']:not(:disabled)").forEach(b => {
+                b.checked = true;
+                b.dispatchEvent(new Event('change', { bubbles: true }));
+            });
+        }"""), 2000, name="area_select")
+        await ur_browser.goto(page, f"{ur_http.UR_BASE}/chintai/kanto/{area_code}/result/", "result")
+
+        async for cards in ur_pagination.result_pages(
+                context, page, area_code.upper(), "a:has-text('部屋詳細')", read_cards, ROOM_LIST_SIGNATURE,
+                page_reader=read_result_cards, links_of=lambda cards: [c["href"] for c in cards]):
+            await enqueue(cards)
+
+        # 等待队列中剩余的详情页全部处理完
+        await queue.join()
+    finally:
+        # 翻页失败时也要停止 worker 并关闭 context
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await context.close()
+
+    if DELTA_CRAWL and queued_urls:
+        print(f"⚡ {area_code.upper()} 增量抓取: 共 {len(queued_urls)} 个房间，{delta_skipped} 个未变动跳过详情页 "
+              f"({delta_skipped / len(queued_urls):.0%})")
+    return seen_urls, time.monotonic() - started
+
+def run_area_process(area_code, existing):
+    """子进程入口 (AREA_PARALLEL=process)：返回本地区的结果和无变动房源"""
+    seen, elapsed = ur_areas.run_area_process(scan_area, area_code, existing_pages_map, existing, writer)
+    return seen, elapsed, unchanged_urls
+
+async def main():
+    # 1. 后台同步数据库快照，浏览器启动与地区页面加载同时进行；处理房间前再等待同步完成
+    global existing_sync
+    existing_sync = asyncio.create_task(fetch_all_existing_pages())
+    writer.start()
+
+    try:
+        if ur_areas.AREA_PARALLEL == "process":
+            # 快照只在主进程同步一次，再传给各子进程
+            await existing_sync
+        results = await ur_areas.scan_all(scan_area, AREAS, run_area_process, existing_pages_map)
+        if ur_areas.AREA_PARALLEL == "process":
+            # 子进程额外带回本地区的无变动房源
+            for area_code, out in results.items():
+                if not isinstance(out, Exception):
+                    seen, elapsed, unchanged = out
+                    unchanged_urls.update(unchanged)
+                    results[area_code] = (seen, elapsed)
+        await existing_sync
+
+        # 合并各地区结果：本次见到的所有 URL 集合
+        seen_urls = set()
+        failed_areas = []
+        print("\n⏱️ 各地区耗时:")
+        for area_code, result in results.items():
+            if isinstance(result, Exception):
+                failed_areas.append(area_code)
+                print(f"    {area_code.upper()}: ❌ 失败 ({result})")
+                continue
+            area_seen, elapsed = result
+            seen_urls |= area_seen
+            print(f"    {area_code.upper()}: {elapsed:.1f}s，{len(area_seen)} 个房间")
+
+        # 2. 心跳: 本地记录存活，过期的批量补写更新时间
+        heartbeat_count = sweep_heartbeats(seen_urls)
+        if heartbeat_count:
+            print(f"\n💓 已为 {heartbeat_count} 条无变动房源批量刷新更新时间")
+
+        # 3. 标记下架房源 (有地区失败时结果不完整，跳过以免误标)
+        deleted_count = 0
+        if failed_areas:
+            print(f"\n⚠️ 地区 {', '.join(failed_areas)} 扫描失败，本次跳过下架检测")
+        else:
+            print("\n🧹 正在检查并更新已下架房源状态...")
+            for url, info in existing_pages_map.items():
+                if url not in seen_urls and info.get("status") != "已下线":
+                    # 该房源在数据库里有，但本次遍历网页没抓到 -> 说明已下架
+                    # 不再删除，而是将“我的状态”更新为“已下线”
+                    update_data = {
+                        "properties": {
+                            "房屋状态": {"status": {"name": "已下线"}}
+                        }
+                    }
+                    # 如果你希望同时清空租金或者更新时间，可以在这里添加
+                    writer.patch(info['page_id'], update_data["properties"])
+                    deleted_count += 1
+                    print(f"    💤 [房源下线]: {info['name']} ({url})")
+    finally:
+        # 中断或出错时也要把已排队的写入 (包括下架标记) 发完
+        await writer.close()
     print(f"\n🎉 任务圆满完成！新增/更新完毕，并标记了 {deleted_count} 条已下线数据。")
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from urllib.parse import urlparse, parse_qsl, urlencode
+from dotenv import load_dotenv
+import ur_browser
+
+load_dotenv()
+
+# 读取第一页后直接拼出第 2..N 页的地址并发打开，无法规划时回退逐页点击「次へ」
+PARALLEL_PAGINATION = os.getenv("PARALLEL_PAGINATION", "1") == "1"
+# 同时打开的结果页数量
+PAGINATION_CONCURRENCY = int(os.getenv("PAGINATION_CONCURRENCY", "4"))
+# 分页链接不是普通 URL (例如 javascript:) 时，用这个查询参数拼接第 N 页的地址
+RESULT_PAGE_PARAM = os.getenv("RESULT_PAGE_PARAM")
+NEXT_SELECTOR = "li.next a, a:has-text('次へ')"
+
+# 从「次へ」所在的分页列表中读取最大页码、当前页码 (无法判断时为 null)，以及第 2 页链接的 href
+PAGINATION_JS = """() => {
+    const next = document.querySelector("li.next");
+    const list = next ? next.parentElement : null;
+    if (!list) return { total: 1, current: null, page2: null };
+    let total = 1, current = null, page2 = null;
+    list.querySelectorAll("li").forEach(li => {
+        const n = parseInt(li.innerText.trim(), 10);
+        if (isNaN(n)) return;
+        total = Math.max(total, n);
+        const a = li.querySelector("a");
+        // 当前页通常带 active/current 类或 aria-current，或者是唯一没有链接的页码
+        const marked = /active|current/.test(li.className) || li.querySelector("[aria-current]");
+        if (marked || !a) current = n;
+        if (n === 2 && a) page2 = a.href;
+    });
+    return { total, current, page2 };
+}"""
+
+def _with_param(url, key, n):
+    parsed = urlparse(url)
+    query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+    query[key] = str(n)
+    return parsed._replace(query=urlencode(query)).geturl()
+
+def _page_key(href):
+    """在第 2 页链接中找出值为 2 的查询参数，即页码参数"""
+    if not href or not href.startswith("http"):
+        return None
+    for key, value in parse_qsl(urlparse(href).query):
+        if value == "2":
+            return key
+    return None
+
+async def plan_page_urls(page):
+    """
+    在第一页结果页上规划剩余页面的 URL (第 2..N 页)。
+    无法确定总页数或页码参数时返回 None，调用方应回退到逐页点击「次へ」。
+    """
+    info = await page.evaluate(PAGINATION_JS)
+    total = info["total"]
+    if total <= 1:
+        return None
+    key = _page_key(info["page2"])
+    if key:
+        base = info["page2"]
+    elif RESULT_PAGE_PARAM:
+        key, base = RESULT_PAGE_PARAM, page.url
+    else:
+        return None
+    return [_with_param(base, key, n) for n in range(2, total + 1)]
+
+async def next_button(page):
+    """返回页面上可见的「次へ」按钮，没有则返回 None"""
+    next_btn = await page.query_selector(NEXT_SELECTOR)
+    return next_btn if next_btn and await next_btn.is_visible() else None
+
+async def has_next_page(page):
+    """分页列表中当前页之后是否还有页面；无法判断当前页时看「次へ」是否可见"""
+    pager = await page.evaluate(PAGINATION_JS)
+    if pager["current"] is not None:
+        return pager["current"] < pager["total"]
+    return await next_button(page) is not None
+
+async def fetch_pages(context, urls, ready_selector, reader, concurrency=PAGINATION_CONCURRENCY):
+    """
+    并发打开多个结果页，页面出现 ready_selector 后用 reader(page) 读取内容。
+    返回 (按 urls 顺序的内容列表, 最后一页之后是否还有页面)。
+    任何一页两次都读取失败则抛出异常：漏掉的页面会导致下架检测误判，宁可让整个地区失败。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read_one(url):
+        async with semaphore:
+            last_error = None
+            for _ in range(2):
+                p = await context.new_page()
+                try:
+                    await ur_browser.goto(p, url, "result", wait_until="domcontentloaded")
+                    await ur_browser.wait_for_selector(p, ready_selector, "result", timeout=15000)
+                    content = await reader(p)
+                    return content, url == urls[-1] and await has_next_page(p)
+                except Exception as e:
+                    last_error = e
+                finally:
+                    await p.close()
+            raise RuntimeError(f"结果页读取失败 {url}: {last_error}")
+
+    results = await asyncio.gather(*(read_one(u) for u in urls), return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            raise r
+    return [content for content, _ in results], results[-1][1]
+
+async def result_pages(context, page, label, ready_selector, reader, signature_js,
+                       page_reader=None, links_of=None, ready_timeout=15000):
+    """
+    遍历一个地区的全部结果页 (page 已打开第一页)，逐页产出内容。
+    reader(page) 读取主页面上的内容；page_reader 用于并发打开的其它页面 (默认同 reader)；
+    links_of(内容) 返回用于比较的链接列表 (默认内容本身就是链接列表)。
+    第一页之后优先并发读取拼接出的页面 (最后一页之后仍有页面时从该页继续点击)，否则逐页点击「次へ」。
+    读取失败的页面会抛出异常。
+    """
+    page_reader = page_reader or reader
+    links_of = links_of or (lambda content: content)
+    page_num = 1
+    while True:
+        print(f"--- 📄 {label} 正在扫描第 {page_num} 页 ---")
+        try:
+            await ur_browser.wait_for_selector(page, ready_selector, "result", timeout=ready_timeout)
+        except Exception:
+            print("  ℹ️ 该地区扫描完毕或未发现房源")
+            return
+
+        content = await reader(page)
+        links = links_of(content)
+        yield content
+
+        # 第一页读完后规划剩余页面，并发读取全部内容
+        if PARALLEL_PAGINATION and page_num == 1:
+            page_urls = await plan_page_urls(page)
+            if page_urls:
+                print(f"🗺️ {label} 共 {len(page_urls) + 1} 页，并发读取剩余结果页")
+                contents, more = await fetch_pages(context, page_urls, ready_selector, page_reader)
+                if all(links_of(c) != links for c in contents):
+                    for c in contents:
+                        yield c
+                    if not more:
+                        return
+                    # 分页列表只显示了部分页码，从最后一个已读页面继续逐页点击
+                    page_num = len(page_urls) + 1
+                    print(f"    ⚠️ 第 {page_num} 页之后仍有结果页，继续逐页翻页")
+                    await ur_browser.goto(page, page_urls[-1], "result", wait_until="domcontentloaded")
+                    await ur_browser.wait_for_selector(page, ready_selector, "result", timeout=ready_timeout)
+                    # 重新读取一次，同时取走该页面的接口数据，避免混入下一页
+                    await reader(page)
+                else:
+                    # 服务器忽略了页码参数 (返回的仍是第一页)，改为逐页点击
+                    print("    ⚠️ 拼接的分页地址无效，回退到逐页翻页")
+
+        # 最后一页以分页列表为准 (当前页 == 最大页码)，不能靠翻页后列表是否变化来判断
+        if not await has_next_page(page):
+            return
+        next_btn = await next_button(page)
+        if not next_btn:
+            raise RuntimeError(f"{label} 第 {page_num} 页之后还有结果页，但找不到「次へ」")
+        page_num += 1
+        old_signature = await ur_browser.list_signature(page, signature_js)
+        await next_btn.click()
+        try:
+            await ur_browser.wait_for_list_change(page, signature_js, old_signature, 4000,
+                                                  timeout_ms=ready_timeout, name="next_page")
+        except Exception as e:
+            # 漏读后续页面会让下架检测误判，翻页超时则整个地区失败
+            raise RuntimeError(f"{label} 第 {page_num} 页翻页后列表未变化: {e}") from e
@@ -1,176 +1,260 @@
 import asyncio
-from playwright.async_api import async_playwright
 import re
-import requests
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from notion_client import parse_notion_time
+from notion_writer import NotionWriter
+import ur_http
+import ur_extract
+import ur_browser
+import ur_api
+import ur_pagination
+import ur_areas
+import local_store
+import metrics
 
 load_dotenv()
 
 # --- 配置 ---
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID = os.getenv("DATABASE_D_ID")
 AREAS = ["tokyo", "kanagawa", "chiba"]
-
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
+# 先用纯 HTTP 解析团地页和地图页，缺字段再回退浏览器 (设为 0 则总是用浏览器)
+HTTP_FAST_PATH = os.getenv("HTTP_FAST_PATH", "1") == "1"
+# 监听结果页后台的 JSON 接口，直接从接口数据解析团地列表 (解析不到时回退读 DOM)
+CAPTURE_XHR = os.getenv("CAPTURE_XHR", "0") == "1"
+# 增量模式：库中已有的团地不再访问详情页 (设为 0 则每个团地都重新抓取)
+INCREMENTAL = os.getenv("INCREMENTAL", "1") == "1"
+# 已有团地超过多少天未更新就重新抓取并刷新 (0 表示从不刷新)
+DANCHI_REFRESH_DAYS = float(os.getenv("DANCHI_REFRESH_DAYS", "0"))
+# 结果列表签名：翻页后签名变化即说明新一页已渲染
+DANCHI_LIST_SIGNATURE = """() => Array.from(document.querySelectorAll("a.rep_bukken-link")).map(a => a.href).join("|")"""
 
 existing_pages_map = {}
+# main 中启动的快照同步任务，为 None 表示已同步 (或由调用方自行同步)
+existing_sync = None
+# Notion 写入队列：抓取协程只投递，不等待写入完成
+writer = NotionWriter()
 
-def call_notion_api(method, url, data=None):
-    try:
-        if method == "POST":
-            response = requests.post(url, headers=HEADERS, json=data)
-        elif method == "PATCH":
-            response = requests.patch(url, headers=HEADERS, json=data)
-
-        if response.status_code not in [200, 201]:
-            print(f"❌ Notion API 错误 ({response.status_code}): {response.text}")
-            return None
-        return response.json()
-    except Exception as e:
-        print(f"❌ 网络请求异常: {e}")
-        return None
+def parse_existing_page(page):
+    """Notion 页面 -> (url, 本地快照)，没有链接的页面返回 None"""
+    url_prop = page["properties"].get("链接", {}).get("url")
+    if not url_prop: return None
+    name_list = page["properties"].get("团地名称", {}).get("title", [])
+    name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
+    updated_prop = (page["properties"].get("更新时间", {}).get("date") or {}).get("start")
+    return url_prop, {
+        "page_id": page["id"],
+        "name": name_text,
+        "updated": updated_prop,
+    }
 
 async def fetch_all_existing_pages():
-    """程序启动时，一次性获取数据库所有房源的 URL 和价格"""
+    """程序启动时，从本地镜像库读取现有数据 (只向 Notion 增量同步有变动的页面)"""
     global existing_pages_map
     print("📡 正在同步 Notion 数据库现状...")
-    query_url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    has_more = True
-    next_cursor = None
-
-    while has_more:
-        payload = {"page_size": 100}
-        if next_cursor:
-            payload["start_cursor"] = next_cursor
-
-        res = call_notion_api("POST", query_url, payload)
-        if not res: break
-
-        for page in res.get("results", []):
-            name_list = page["properties"].get("团地名称", {}).get("title", [])
-            name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
-            url_prop = page["properties"].get("链接", {}).get("url")
-            if url_prop:
-                existing_pages_map[url_prop] = {
-                    "page_id": page["id"],
-                    "name": name_text,
-                }
-        has_more = res.get("has_more")
-        next_cursor = res.get("next_cursor")
-
+    existing_pages_map.update(await asyncio.to_thread(local_store.load_existing_pages, DATABASE_ID, parse_existing_page))
     print(f"✅ 同步完成，库中现有 {len(existing_pages_map)} 条团地。")
 
+async def get_coords(p):
+    """浏览器端读取坐标，规则与 ur_http.parse_coords 共用"""
+    return ur_extract.coords_from_fields(await ur_extract.extract(p, ur_extract.COORDS_SPEC))
+
 async def scrape_danchi_details(page, danchi_url, seen_urls):
     danchi_name = "未知团地"
     try:
         # 调试日志：确认进入了函数
         seen_urls.add(danchi_url)
-        
-        # 改用 networkidle，确保网络请求相对安静
-        await page.goto(danchi_url, wait_until="commit", timeout=30000)
-        await page.wait_for_selector("h1.article_headings", timeout=5000)
-        try:
-            # 使用 JavaScript 精准提取 span 里的文字，忽略 rt 注音
-            danchi_name = await page.evaluate('''() => {
-                const rubySpan = document.querySelector("h1.article_headings ruby span");
-                const fallbackH1 = document.querySelector("h1.article_headings");
-                if (rubySpan) return rubySpan.innerText.trim();
-                if (fallbackH1) return fallbackH1.innerText.split('\\n')[0].trim();
-                return "名称解析失败";
-            }''')
-        except Exception as e:
-            print(f"    ⚠️ 名称抓取重试中... {e}")
+
+        danchi = None
+        if HTTP_FAST_PATH:
+            danchi = ur_http.parse_danchi_html(await asyncio.to_thread(ur_http.fetch_html, danchi_url))
+
+        # 名称是否真正解析成功；失败时已有团地不覆盖 Notion 中的名称
+        name_resolved = False
+        if danchi:
+            danchi_name = danchi["name"]
+            name_resolved = True
+        else:
+            metrics.incr("browser_fallback", stage="danchi")
+            # 改用 networkidle，确保网络请求相对安静
+            await ur_browser.goto(page, danchi_url, "danchi", wait_until="commit", timeout=30000)
+            await ur_browser.wait_for_selector(page, "h1.article_headings", "danchi", timeout=5000)
+            try:
+                # 与 HTTP 路径共用 ur_extract.DANCHI_SPEC：忽略 rt 注音，只取名称文字
+                danchi = ur_extract.danchi_from_fields(await ur_extract.extract(page, ur_extract.DANCHI_SPEC))
+                name_resolved = danchi["name"] is not None
+                danchi_name = danchi["name"] or "名称解析失败"
+            except Exception as e:
+                print(f"    ⚠️ 名称抓取重试中... {e}")
 
         print(f"    🏘️ 抓取到团地名称: {danchi_name}")
-        async def get_coords(p):
-            return await p.evaluate('''() => {
-                const latEl = document.querySelector(".js-lat-data");
-                const lngEl = document.querySelector(".js-lng-data");
-                return latEl && lngEl ? { lat: latEl.value, lng: lngEl.value } : null;
-            }''')
         
-        map_url = danchi_url.replace(".html", "_map.html")
-        print(f"    🔄 主页未找到坐标，尝试跳转地图页: {map_url}")
-        await page.goto(map_url, wait_until="domcontentloaded")
-        # 在地图页给一点缓冲时间
-        await page.wait_for_timeout(1000)
-        coords = await get_coords(page)
+        coords = danchi["coords"] if danchi else None
+        danchi_id = ur_http.danchi_id_from_url(danchi_url)
+        if coords:
+            local_store.save_coords(danchi_id, coords)
+        else:
+            # 团地坐标缓存可能已由房间扫描器填好，命中则不再访问地图页
+            cached, coords = local_store.lookup_coords(danchi_id)
+            if not cached:
+                map_url = danchi_url.replace(".html", "_map.html")
+                print(f"    🔄 主页未找到坐标，尝试跳转地图页: {map_url}")
+                if HTTP_FAST_PATH:
+                    coords = ur_http.parse_coords(await asyncio.to_thread(ur_http.fetch_html, map_url))
+                if not coords:
+                    await ur_browser.goto(page, map_url, "map", wait_until="domcontentloaded")
+                    # 坐标标签出现即返回，最多等 1 秒
+                    await ur_browser.wait_for_selector_within(page, ".js-lat-data", 1000, name="map_coords")
+                    coords = await get_coords(page)
+                local_store.save_coords(danchi_id, coords)
         if coords:
             lat_num = float(coords['lat'])
             lng_num = float(coords['lng'])
             print(f"    📍 坐标抓取成功: {lat_num}, {lng_num}")
         else:
+            # 坐标未知时留空，不写 0.0
             print(f"    ⚠️ 最终未能找到坐标标签")
-            lat_num, lng_num = 0.0, 0.0
+            lat_num, lng_num = None, None
+
+        # 带时区偏移的本地时间，DANCHI_REFRESH_DAYS 按真实时间比较
+        updated = datetime.now().astimezone().isoformat(timespec="seconds")
+
+        # 已有团地只刷新成功解析的字段，解析失败的名称和未知坐标不覆盖 Notion 中已有的值
+        page_info = existing_pages_map.get(danchi_url)
+        if page_info:
+            update = {"更新时间": {"date": {"start": updated}}}
+            if name_resolved:
+                update["团地名称"] = {"title": [{"text": {"content": danchi_name}}]}
+            if coords:
+                update["纬度"] = {"number": lat_num}
+                update["经度"] = {"number": lng_num}
+
+            name = danchi_name if name_resolved else page_info["name"]
+
+            def on_refreshed(res, page_info=page_info, name=name, updated=updated):
+                if res:
+                    page_info.update({"name": name, "updated": updated})
+                    print(f"    🔁 [刷新] {name}")
+            writer.patch(page_info["page_id"], update, on_refreshed)
+            return
 
-        
         props = {
             "团地名称": {"title": [{"text": {"content": danchi_name}}]},
             "纬度": {"number": lat_num}, 
             "经度": {"number": lng_num},
             "链接": {"url": danchi_url},
-            "更新时间": {"date": {"start": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")}}
+            "更新时间": {"date": {"start": updated}}
         }
-        
+
         # 执行上传
-        call_notion_api("POST", "https://api.notion.com/v1/pages", {"parent": {"database_id": DATABASE_ID}, "properties": props})
-        print(f"    ✨ [新增] {danchi_name} ({lat_num}, {lng_num})")
+        def on_created(res, name=danchi_name, lat=lat_num, lng=lng_num, updated=updated):
+            if res:
+                existing_pages_map[danchi_url] = {"page_id": res["id"], "name": name, "updated": updated}
+                print(f"    ✨ [新增] {name} ({lat}, {lng})")
+        writer.create(DATABASE_ID, props, on_created)
     except Exception as e:
         print(f"    ❌ 抓取失败 {danchi_url}: {e}")
 
-async def main():
-    await fetch_all_existing_pages()
+def needs_scrape(danchi_url):
+    """增量模式下判断团地是否需要访问：新团地，或超过刷新周期的已有团地"""
+    info = existing_pages_map.get(danchi_url)
+    if not INCREMENTAL or not info:
+        return True
+    if DANCHI_REFRESH_DAYS <= 0:
+        return False
+    updated = parse_notion_time(info.get("updated"))
+    return not updated or updated < datetime.now() - timedelta(days=DANCHI_REFRESH_DAYS)
+
+async def read_danchi_links(page):
+    """读取结果页上所有团地详情链接 (完整 URL)"""
+    return await page.evaluate("""() => Array.from(document.querySelectorAll("a.rep_bukken-link")).map(a => a.href)""")
+
+async def scan_area(browser, area_code):
+    """在独立的 BrowserContext 中扫描一个地区，返回 (本地区见到的 URL 集合, 耗时秒数)"""
+    started = time.monotonic()
     seen_urls = set()
+    skipped = 0
+    context = await ur_browser.new_context(browser)
+    page = await context.new_page()
+    capture = None
+    if CAPTURE_XHR:
+        capture = ur_api.SearchCapture()
+        capture.attach(page)
+
+    async def process_links(links):
+        nonlocal skipped
+        if existing_sync:
+            await existing_sync
+        # 复用同一个详情页对象，避免开太多窗口导致电脑卡死
+        worker_page = await context.new_page()
+        for link in links:
+            if not needs_scrape(link):
+                seen_urls.add(link)
+                skipped += 1
+                continue
+            await scrape_danchi_details(worker_page, link, seen_urls)
+        await worker_page.close()
+
+    async def read_links(p):
+        """主结果页优先用接口数据，解析不到时读 DOM"""
+        if capture:
+            links = [url for payload in await capture.take() for url in ur_api.extract_danchi(payload)]
+            if links:
+                return links
+        return await read_danchi_links(p)
+
+    try:
+        print(f"\n🌍 正在扫描地区: {area_code.upper()}")
+        # 必须先经过这个页面并勾选，否则直接进入 result 可能会没数据
+        await ur_browser.goto(page, f"{ur_http.UR_BASE}/chintai/kanto/{area_code}/area/", "area")
+        await page.evaluate('document.querySelectorAll("input[type=\'checkbox\']").forEach(i => i.checked = true)')
+    
+        # 点击搜索按钮或直接跳转结果页
+        await ur_browser.goto(page, f"{ur_http.UR_BASE}/chintai/kanto/{area_code}/result/", "result")
+
+        async for links in ur_pagination.result_pages(
+                context, page, area_code.upper(), "a.rep_bukken-link", read_links, DANCHI_LIST_SIGNATURE,
+                page_reader=read_danchi_links, ready_timeout=10000):
+            await process_links(links)
+    finally:
+        await context.close()
+    if skipped:
+        print(f"⚡ {area_code.upper()} 增量模式: {skipped} 个已知团地未重新抓取")
+    return seen_urls, time.monotonic() - started
+
+def run_area_process(area_code, existing):
+    """子进程入口 (AREA_PARALLEL=process)：返回本地区的结果"""
+    return ur_areas.run_area_process(scan_area, area_code, existing_pages_map, existing, writer)
+
+async def main():
+    # 后台同步数据库快照，浏览器启动与地区页面加载同时进行；处理链接前再等待同步完成
+    global existing_sync
+    existing_sync = asyncio.create_task(fetch_all_existing_pages())
+    writer.start()
+
+    try:
+        if ur_areas.AREA_PARALLEL == "process":
+            # 快照只在主进程同步一次，再传给各子进程
+            await existing_sync
+        results = await ur_areas.scan_all(scan_area, AREAS, run_area_process, existing_pages_map)
+        await existing_sync
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        for area_code in AREAS:
-            print(f"\n🌍 正在扫描地区: {area_code.upper()}")
-            # 必须先经过这个页面并勾选，否则直接进入 result 可能会没数据
-            await page.goto(f"https://www.ur-net.go.jp/chintai/kanto/{area_code}/area/")
-            await page.evaluate('document.querySelectorAll("input[type=\'checkbox\']").forEach(i => i.checked = true)')
-            
-            # 点击搜索按钮或直接跳转结果页
-            await page.goto(f"https://www.ur-net.go.jp/chintai/kanto/{area_code}/result/")
-
-            page_num = 1
-            while True:
-                print(f"--- 📄 {area_code.upper()} 正在扫描第 {page_num} 页 ---")
-                try:
-                    await page.wait_for_selector("a.rep_bukken-link", timeout=10000)
-                except:
-                    print("  ℹ️ 该地区扫描完毕或未发现房源")
-                    break
-                
-                # 获取当前页所有链接
-                links = [f"https://www.ur-net.go.jp{await el.get_attribute('href')}" 
-                         for el in await page.query_selector_all("a.rep_bukken-link")]
-
-                # 复用同一个详情页对象，避免开太多窗口导致电脑卡死
-                worker_page = await context.new_page()
-                for link in links:
-                    await scrape_danchi_details(worker_page, link, seen_urls)
-                await worker_page.close()
-
-                # 翻页
-                next_btn = await page.query_selector("li.next a, a:has-text('次へ')")
-                if next_btn and await next_btn.is_visible():
-                    page_num += 1
-                    await next_btn.click()
-                    await page.wait_for_timeout(4000)
-                else: break
-
-        await browser.close()
-        print("\n🎉 任务全部完成！")
+        # 合并各地区结果
+        seen_urls = set()
+        print("\n⏱️ 各地区耗时:")
+        for area_code, result in results.items():
+            if isinstance(result, Exception):
+                print(f"    {area_code.upper()}: ❌ 失败 ({result})")
+                continue
+            area_seen, elapsed = result
+            seen_urls |= area_seen
+            print(f"    {area_code.upper()}: {elapsed:.1f}s，{len(area_seen)} 个团地")
+    finally:
+        # 中断或出错时也要把已排队的写入发完
+        await writer.close()
+    print(f"\n🎉 任务全部完成！本次共见到 {len(seen_urls)} 个团地。")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
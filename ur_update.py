@@ -1,72 +1,83 @@
 import asyncio
 from playwright.async_api import async_playwright
 import re
-import requests
+import time
+from collections import Counter
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from notion_writer import NotionWriter
+import ur_http
+import ur_extract
+import ur_browser
+import local_store
+import metrics
 
 load_dotenv()
 
 # --- 配置 ---
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DATABASE_ID = os.getenv("DATABASE_D_ID")
 AREAS = ["tokyo", "kanagawa", "chiba"]
-
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
+# 先用纯 HTTP 解析价格表，表格不在原始 HTML 中时再回退浏览器 (设为 0 则总是用浏览器)
+HTTP_FAST_PATH = os.getenv("HTTP_FAST_PATH", "1") == "1"
+# 同时抓取的页面数
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "3"))
+# 刷新顺序: oldest - 最久未刷新的团地优先 (从未刷新过的最先); notion - 按数据库顺序
+UPDATE_ORDER = os.getenv("UPDATE_ORDER", "oldest")
+# 本次运行的时间预算 (分钟)，到时不再开始新的团地，0 表示不限
+UPDATE_BUDGET_MINUTES = float(os.getenv("UPDATE_BUDGET_MINUTES", "0"))
+
+# 本脚本写入的列及其类型，用于和 Notion 中的现值比对
+TRACKED_PROPERTIES = {
+    "租金下限": "number", "租金上限": "number", "管理费": "number",
+    "面积下限": "rich_text", "面积上限": "rich_text",
+    "房型下限": "select", "房型上限": "select",
 }
 
 existing_pages_map = {}
-
-def call_notion_api(method, url, data=None):
-    try:
-        if method == "POST":
-            response = requests.post(url, headers=HEADERS, json=data)
-        elif method == "PATCH":
-            response = requests.patch(url, headers=HEADERS, json=data)
-
-        if response.status_code not in [200, 201]:
-            print(f"❌ Notion API 错误 ({response.status_code}): {response.text}")
-            return None
-        return response.json()
-    except Exception as e:
-        print(f"❌ 网络请求异常: {e}")
-        return None
+# Notion 写入队列：只 PATCH 有变化的列
+writer = NotionWriter()
+
+def property_value(prop, kind):
+    """Notion 属性 (查询结果或 PATCH 内容) -> 可比较的值"""
+    if not prop: return None
+    if kind == "number":
+        return prop.get("number")
+    if kind == "select":
+        return (prop.get("select") or {}).get("name")
+    texts = prop.get("rich_text") or []
+    return "".join(t.get("plain_text") or t.get("text", {}).get("content", "") for t in texts) or None
+
+def parse_existing_page(page):
+    """Notion 页面 -> (url, 本地快照)，没有链接的页面返回 None"""
+    url_prop = page["properties"].get("链接", {}).get("url")
+    if not url_prop: return None
+    name_list = page["properties"].get("团地名称", {}).get("title", [])
+    name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
+    return url_prop, {
+        "page_id": page["id"],
+        "name": name_text,
+        "values": {k: property_value(page["properties"].get(k), kind) for k, kind in TRACKED_PROPERTIES.items()},
+    }
 
 async def fetch_all_existing_pages():
-    """程序启动时，一次性获取数据库所有房源的 URL 和价格"""
+    """程序启动时，从本地镜像库读取现有数据 (只向 Notion 增量同步有变动的页面)"""
     global existing_pages_map
     print("📡 正在同步 Notion 数据库现状...")
-    query_url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    has_more = True
-    next_cursor = None
-
-    while has_more:
-        payload = {"page_size": 100}
-        if next_cursor:
-            payload["start_cursor"] = next_cursor
-
-        res = call_notion_api("POST", query_url, payload)
-        if not res: break
-
-        for page in res.get("results", []):
-            name_list = page["properties"].get("团地名称", {}).get("title", [])
-            name_text = name_list[0].get("plain_text", "未知房源") if name_list else "未知房源"
-            url_prop = page["properties"].get("链接", {}).get("url")
-            if url_prop:
-                existing_pages_map[url_prop] = {
-                    "page_id": page["id"],
-                    "name": name_text,
-                }
-        has_more = res.get("has_more")
-        next_cursor = res.get("next_cursor")
-
+    existing_pages_map.update(await asyncio.to_thread(local_store.load_existing_pages, DATABASE_ID, parse_existing_page, "update"))
     print(f"✅ 同步完成，库中现有 {len(existing_pages_map)} 条团地。")
 
-async def scrape_detail_page(page, url):
+async def read_sliders_rows(page, url):
+    """浏览器回退路径：渲染页面后读取价格表每一行的 (th, td) 文本"""
+    await ur_browser.goto(page, url, "danchi", wait_until="domcontentloaded", timeout=60000)
+    
+    table_selector = "div.article_sliders_table"
+    await ur_browser.wait_for_selector(page, table_selector, "danchi", timeout=10000)
+
+    # 所有行在一次 page.evaluate 中读取，规则与 ur_http.parse_sliders_rows 共用
+    return (await ur_extract.extract(page, ur_extract.SLIDERS_SPEC))["rows"]
+
+async def scrape_detail_page(page, url, stats):
     page_info = existing_pages_map.get(url)
     if not page_info: return
     
@@ -74,13 +85,13 @@ async def scrape_detail_page(page, url):
     name = page_info["name"]
 
     try:
-        print(f"🧐 正在抓取: {name}")
-        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        
-        table_selector = "div.article_sliders_table"
-        await page.wait_for_selector(table_selector, timeout=10000)
-
-        rows = await page.query_selector_all(f"{table_selector} tr")
+        rows = None
+        if HTTP_FAST_PATH:
+            rows = ur_http.parse_sliders_rows(await asyncio.to_thread(ur_http.fetch_html, url))
+        # 原始 HTML 里没有家賃行，说明价格表依赖 JS 渲染
+        if not rows or not any("家賃" in label for label, _ in rows):
+            metrics.incr("browser_fallback", stage="danchi")
+            rows = await read_sliders_rows(page, url)
         
         data = {
             "price_min": None, "price_max": None, "common_fee": None,
@@ -88,14 +99,7 @@ async def scrape_detail_page(page, url):
             "area_min": None, "area_max": None
         }
 
-        for row in rows:
-            th = await row.query_selector("th")
-            if not th: continue
-            label = await th.inner_text()
-            td = await row.query_selector("td")
-            if not td: continue
-            text = (await td.inner_text()).replace("\n", "").strip()
-
+        for label, text in rows:
             # 1. 解析价格和共益费
             if "家賃" in label:
                 prices = re.findall(r"([\d,]+)円", text)
@@ -137,14 +141,54 @@ async def scrape_detail_page(page, url):
         if data["room_min"]: props["房型下限"] = {"select": {"name": data["room_min"]}}
         if data["room_max"]: props["房型上限"] = {"select": {"name": data["room_max"]}}
         
-        if props:
-            call_notion_api("PATCH", f"https://api.notion.com/v1/pages/{page_id}", {"properties": props})
-            print(f"✅ 更新成功: {name}")
+        # 只 PATCH 与 Notion 现值不同的列
+        values = page_info.get("values") or {}
+        changed = {k: v for k, v in props.items() if property_value(v, TRACKED_PROPERTIES[k]) != values.get(k)}
+        stats["scraped"] += 1
+        if not changed:
+            local_store.record_refreshed(DATABASE_ID, url)
+            stats["unchanged"] += 1
+            print(f"😴 无变化: {name}")
+            return
+
+        # 写入成功后才记为已刷新，失败的团地下次按 oldest 顺序仍排在前面
+        def on_updated(res, page_info=page_info, changed=changed):
+            if res:
+                page_info.setdefault("values", {}).update(
+                    {k: property_value(v, TRACKED_PROPERTIES[k]) for k, v in changed.items()})
+                local_store.record_refreshed(DATABASE_ID, url)
+        writer.patch(page_id, changed, on_updated)
+        stats["patched"] += 1
+        print(f"✅ 更新 {name}: {', '.join(changed)}")
 
     except Exception as e:
+        stats["failed"] += 1
         print(f"    ❌ 抓取/更新失败 {url}: {e}")
 
-# main 函数保持你最后提供的那个版本即可，它已经是基于 Notion URL 列表遍历的了。
+def refresh_order(urls):
+    """按 UPDATE_ORDER 排序待刷新的 URL"""
+    if UPDATE_ORDER != "oldest":
+        return list(urls)
+    refreshed = local_store.last_refreshed(DATABASE_ID)
+    # 从未刷新过的排在最前 (空字符串最小)
+    return sorted(urls, key=lambda u: refreshed.get(u, ""))
+
+async def update_worker(context, queue, politeness, deadline, stats):
+    """每个 worker 独占一个 page，从队列中取团地刷新，超过时间预算后不再开始新的团地"""
+    page = await context.new_page()
+    try:
+        while True:
+            url = await queue.get()
+            try:
+                if deadline and time.monotonic() > deadline:
+                    stats["skipped"] += 1
+                    continue
+                await politeness.wait()
+                await scrape_detail_page(page, url, stats)
+            finally:
+                queue.task_done()
+    finally:
+        await page.close()
 
 async def main():
     # 1. 第一步：获取 Notion 数据库中现有的所有页面和 URL
@@ -154,24 +198,43 @@ async def main():
         print("终止：Notion 数据库中没有发现任何带有 URL 的数据。")
         return
 
-    # 2. 第二步：启动浏览器，遍历 URL 进行爬取
-    async with async_playwright() as p:
-        # headless=True 建议正式运行时开启，速度更快
-        browser = await p.chromium.launch(headless=False) 
-        context = await browser.new_context()
-        page = await context.new_page()
+    urls = await asyncio.to_thread(refresh_order, existing_pages_map.keys())
+    deadline = time.monotonic() + UPDATE_BUDGET_MINUTES * 60 if UPDATE_BUDGET_MINUTES > 0 else None
+    stats = Counter()
+    writer.start()
 
-        print(f"\n🚀 开始根据 Notion 列表更新详细数据，共 {len(existing_pages_map)} 个房源...")
-
-        # 直接遍历同步回来的 URL 字典
-        for url in existing_pages_map.keys():
-            await scrape_detail_page(page, url)
-            # 适当延迟，防止请求过快被封或触发 Notion API 速率限制
-            await asyncio.sleep(1)
-
-        await browser.close()
-        print("\n✨ 所有房源数据更新任务已完成！")
+    try:
+        # 2. 第二步：启动浏览器，多个 page 并发抓取
+        async with async_playwright() as p:
+            # headless=True 建议正式运行时开启，速度更快
+            browser = await p.chromium.launch(headless=ur_browser.HEADLESS)
+            context = await ur_browser.new_context(browser)
+
+            print(f"\n🚀 开始根据 Notion 列表更新详细数据，共 {len(urls)} 个团地 (并发 {UPDATE_WORKERS}，顺序 {UPDATE_ORDER})...")
+
+            # 两次抓取之间至少间隔 1 秒 (所有 worker 共用)，防止请求过快被封
+            politeness = ur_browser.Politeness(ur_browser.politeness_interval(1.0))
+            queue = asyncio.Queue()
+            for url in urls:
+                queue.put_nowait(url)
+            workers = [asyncio.create_task(update_worker(context, queue, politeness, deadline, stats))
+                       for _ in range(UPDATE_WORKERS)]
+            await queue.join()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+            await browser.close()
+            ur_browser.report_route_stats()
+            ur_browser.report_wait_stats()
+    finally:
+        # 中断或出错时也要把已排队的写入发完
+        await writer.close()
+
+    print(f"\n📊 抓取 {stats['scraped']} 个，更新 {stats['patched']} 个，无变化 {stats['unchanged']} 个，失败 {stats['failed']} 个")
+    if stats["skipped"]:
+        print(f"⏰ 已到时间预算，{stats['skipped']} 个团地留待下次运行 (下次优先)")
+    print("\n✨ 所有房源数据更新任务已完成！")
 
 if __name__ == "__main__":
     asyncio.run(main())
-
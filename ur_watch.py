@@ -1,6 +1,20 @@
 import asyncio
 from playwright.async_api import async_playwright
-import time
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+from notion_client import iter_database
+import ur_browser
+import ur_api
+import local_store
+import metrics
+
+load_dotenv()
 
 TARGET_URLS = [
     "https://www.ur-net.go.jp/chintai/kanto/kanagawa/40_0520.html",
@@ -16,68 +30,332 @@ TARGET_URLS = [
     "https://www.ur-net.go.jp/chintai/kanto/kanagawa/40_1710.html"
 ]
 
-async def check_with_browser(context, url):
+# --- 守护进程配置 ---
+# 监控目标来源：文件 (每行一个团地 URL，# 开头为注释)；或设 WATCH_FROM_NOTION=1 读取团地数据库；都没有则用 TARGET_URLS
+WATCH_TARGETS_FILE = os.getenv("WATCH_TARGETS_FILE")
+WATCH_FROM_NOTION = os.getenv("WATCH_FROM_NOTION", "0") == "1"
+DANCHI_DATABASE_ID = os.getenv("DATABASE_D_ID")
+# 每隔多少分钟重新加载一次目标列表
+WATCH_RELOAD_MINUTES = float(os.getenv("WATCH_RELOAD_MINUTES", "30"))
+# 同时检查的目标数
+WATCH_CONCURRENCY = int(os.getenv("WATCH_CONCURRENCY", "3"))
+# 每个目标的轮询间隔 (秒)：有变化时回到最小值，无变化时逐次乘以 WATCH_BACKOFF，直到最大值
+WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", "120"))
+WATCH_MAX_INTERVAL = float(os.getenv("WATCH_MAX_INTERVAL", "1800"))
+WATCH_BACKOFF = float(os.getenv("WATCH_BACKOFF", "1.5"))
+# UR 通常集中放出房源的时段 (日本时间，小时区间，逗号分隔)；时段内间隔不超过最小值
+WATCH_HOT_HOURS = os.getenv("WATCH_HOT_HOURS", "9-11,14-16")
+# 空房数变化事件追加写入的 JSON Lines 文件 (可选)
+WATCH_EVENTS_FILE = os.getenv("WATCH_EVENTS_FILE")
+# 快速检查：直接重放填充 tbody.rep_room 的房间表接口并比较内容哈希 (设为 0 则总是用浏览器)
+WATCH_FAST = os.getenv("WATCH_FAST", "1") == "1"
+# 房间表接口 URL 的特征 (正则)，UR 接口路径变化时可通过环境变量调整
+ROOM_API_PATTERN = os.getenv("UR_ROOM_API_PATTERN", r"detail_bukken_room")
+
+JST = ZoneInfo("Asia/Tokyo")
+
+# 房源行数量，用于判断表格是否渲染完成
+ROOM_ROWS_SIGNATURE = "() => document.querySelectorAll('tbody.rep_room tr.js-log-item').length"
+
+async def check_with_browser(context, url, capture=None):
+    """返回 (空房数, 说明)；检测失败时空房数为 None。传入 capture 时记录页面发出的房间表请求"""
     page = await context.new_page()
+    if capture:
+        capture.attach(page)
     short_name = url.split('/')[-1]
     try:
         print(f"正在检查: {short_name}...")
-        
+
         # 1. 访问页面
-        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        
+        await ur_browser.goto(page, url, "watch", wait_until="domcontentloaded", timeout=60000)
+
         # 2. 模拟真实用户行为：向下滚动一点点，触发懒加载 JS
         await page.mouse.wheel(0, 500)
-        
+
         # 3. 【关键修改】显式等待房源行出现，或者显示“无房”文字
         # 我们给它最多 15 秒的时间去“生”出房源行
         try:
             # 等待 tr.js-log-item 或者是那个特定的无房提示 ID/Class
-            await page.wait_for_selector("tr.js-log-item, .item_no-data, .list_none", timeout=15000)
+            await ur_browser.wait_for_selector(page, "tr.js-log-item, .item_no-data, .list_none", "watch", timeout=15000)
         except:
             # 如果 15 秒都没出结果，可能是真的没房，也可能是网络卡了
             pass
 
-        # 4. 再次确保数据渲染，稍微停顿 1 秒（玄学但有用）
-        await asyncio.sleep(1)
+        # 4. 再次确保数据渲染：房源行数量不再变化即可，最多等 1 秒
+        await ur_browser.wait_for_stable(page, ROOM_ROWS_SIGNATURE, 1000, name="room_rows")
 
         # 5. 精准判定
         rooms = page.locator("tbody.rep_room tr.js-log-item")
-        count = await rooms.count() / 2
-        
+        count = await rooms.count() // 2
+
         if count > 0:
-            return True, f"🚨 发现空房！共 {count} 间"
-        
+            return count, f"🚨 发现空房！共 {count} 间"
+
         # 检查是否有明确的“无房”提示（文字判断最稳）
         content = await page.content()
         if "ご案内できるお部屋がございません" in content:
-            return False, "暂无空房"
-            
-        return False, "未发现房源（确认无房）"
+            return 0, "暂无空房"
+
+        return 0, "未发现房源（确认无房）"
 
     except Exception as e:
         return None, f"检测失败: {str(e)[:30]}"
     finally:
+        if capture:
+            # 关闭页面前等房间表响应处理完，否则 last_request 可能还没记录
+            await capture.drain()
         await page.close()
 
+def content_hash(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class FastChecker:
+    """
+    快速检查：重放上次记录的房间表请求，响应内容哈希不变即确认空房数未变，无需渲染和滚动。
+    没有可重放的请求、重放失败或内容有变化时，用浏览器检查一次并重新记录请求与哈希。
+    状态保存在本地库中，单次巡检 (cron) 也能直接走快速路径。
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.stats = Counter()
+
+    async def check(self, url):
+        state = await asyncio.to_thread(local_store.load_watch_state, url)
+        if state and state["request"] and state["content_hash"]:
+            with metrics.timer("api_replay"):
+                payload = await asyncio.to_thread(ur_api.fetch_json, state["request"])
+            if payload is not None and content_hash(payload) == state["content_hash"]:
+                self.stats["unchanged"] += 1
+                count = state["vacancies"]
+                return count, f"无变化 ({'共 ' + str(count) + ' 间空房' if count else '暂无空房'})"
+            self.stats["replay_failed" if payload is None else "changed"] += 1
+
+        self.stats["browser"] += 1
+        capture = ur_api.SearchCapture(match=ROOM_API_PATTERN)
+        count, msg = await check_with_browser(self.context, url, capture)
+        if count is not None:
+            record = capture.last_request
+            request = {k: record[k] for k in ("url", "method", "post_data")} if record else None
+            digest = content_hash(record["payload"]) if record else None
+            await asyncio.to_thread(local_store.save_watch_state, url, request, digest, count)
+        return count, msg
+
+    def report(self):
+        for result, n in self.stats.items():
+            metrics.incr("watch_fast_check", n, result=result)
+        if self.stats:
+            print("⚡ 快速检查统计: " + ", ".join(f"{k}={v}" for k, v in sorted(self.stats.items())))
+
+def load_targets():
+    """按 文件 -> Notion 团地库 -> TARGET_URLS 的顺序加载监控目标"""
+    if WATCH_TARGETS_FILE:
+        with open(WATCH_TARGETS_FILE, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith("#")]
+
+    if WATCH_FROM_NOTION:
+        urls = []
+        for page in iter_database(DANCHI_DATABASE_ID, filter_properties=["链接"]):
+            url = page["properties"].get("链接", {}).get("url")
+            if url: urls.append(url)
+        return urls
+
+    return list(TARGET_URLS)
+
+def _hot_windows():
+    windows = []
+    for part in WATCH_HOT_HOURS.split(","):
+        if "-" in part:
+            start, end = part.split("-", 1)
+            windows.append((int(start), int(end)))
+    return windows
+
+def in_hot_window(now):
+    return any(start <= now.hour < end for start, end in _hot_windows())
+
+def seconds_until_hot(now):
+    """距离下一个放房时段开始的秒数 (当前已在时段内返回 0)"""
+    if in_hot_window(now):
+        return 0
+    starts = []
+    for start, _ in _hot_windows():
+        at = now.replace(hour=start, minute=0, second=0, microsecond=0)
+        if at <= now:
+            at += timedelta(days=1)
+        starts.append((at - now).total_seconds())
+    return min(starts) if starts else None
+
+class WatchTarget:
+    """单个团地的轮询状态：上次空房数与自适应间隔"""
+
+    def __init__(self, url):
+        self.url = url
+        self.name = url.split('/')[-1]
+        self.count = None
+        self.interval = WATCH_MIN_INTERVAL
+        self.checks = 0
+
+    def next_delay(self, changed):
+        """根据本次是否有变化调整间隔，返回距下次检查的秒数"""
+        if changed:
+            self.interval = WATCH_MIN_INTERVAL
+        else:
+            self.interval = min(WATCH_MAX_INTERVAL, self.interval * WATCH_BACKOFF)
+        now = datetime.now(JST)
+        if in_hot_window(now):
+            return min(self.interval, WATCH_MIN_INTERVAL)
+        # 放松后的间隔不能跨过下一个放房时段的开始
+        until_hot = seconds_until_hot(now)
+        return min(self.interval, until_hot) if until_hot else self.interval
+
+def emit_event(target, old, new):
+    """空房数变化时输出事件 (并写入 WATCH_EVENTS_FILE)"""
+    event = {
+        "time": datetime.now(JST).isoformat(timespec="seconds"),
+        "url": target.url,
+        "previous": old,
+        "vacancies": new,
+    }
+    print(f"🔔 [{target.name}] 空房数变化: {old} -> {new}")
+    if WATCH_EVENTS_FILE:
+        with open(WATCH_EVENTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+async def watch_target(target, check, semaphore, politeness):
+    while True:
+        try:
+            async with semaphore:
+                await politeness.wait()
+                count, msg = await check(target.url)
+        except Exception as e:
+            # 单次检查出错 (例如开页失败) 不能让该目标的巡检永久停止，按检测失败处理
+            count, msg = None, f"❌ 检查出错: {e}"
+        target.checks += 1
+
+        if count is None:
+            # 检测失败不算“无变化”，保持当前间隔重试
+            print(f"[{target.name}] {msg}")
+            delay = target.interval
+        else:
+            changed = target.count is not None and count != target.count
+            if changed:
+                emit_event(target, target.count, count)
+            elif target.count is None:
+                print(f"[{target.name}] 初始状态: {msg}")
+            target.count = count
+            delay = target.next_delay(changed)
+        await asyncio.sleep(delay)
+
+async def _new_context(browser):
+    # 模拟真实的浏览器特征
+    return await ur_browser.new_context(browser,
+        viewport={'width': 1280, 'height': 800},
+        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+
+async def run_daemon():
+    """常驻巡检：浏览器保持打开，各目标按自己的间隔并发检查，只在空房数变化时输出事件"""
+    async with async_playwright() as p:
+        semaphore = asyncio.Semaphore(WATCH_CONCURRENCY)
+        # 快速检查只发一个小请求，间隔可以更短
+        politeness = ur_browser.Politeness(ur_browser.politeness_interval(1.0 if WATCH_FAST else 3.0))
+        checker = FastChecker(None)
+        # 常驻期间浏览器或 context 可能崩溃，每次检查前确认仍可用，否则重新启动
+        state = {"browser": None, "context": None}
+        relaunch = asyncio.Lock()
+
+        def on_context_close(context):
+            if state["context"] is context:
+                state["context"] = None
+
+        async def ensure_context():
+            async with relaunch:
+                browser = state["browser"]
+                if browser is None or not browser.is_connected():
+                    if browser is not None:
+                        print("⚠️ 浏览器已断开，重新启动")
+                        metrics.incr("watch_browser_restart")
+                    state["browser"] = await p.chromium.launch(headless=True)
+                    state["context"] = None
+                if state["context"] is None:
+                    context = await _new_context(state["browser"])
+                    context.on("close", on_context_close)
+                    state["context"] = checker.context = context
+                return state["context"]
+
+        async def check(url):
+            context = await ensure_context()
+            if WATCH_FAST:
+                return await checker.check(url)
+            return await check_with_browser(context, url)
+
+        tasks = {}
+        targets = {}
+        try:
+            while True:
+                try:
+                    urls = await asyncio.to_thread(load_targets)
+                except Exception as e:
+                    print(f"⚠️ 目标列表加载失败，沿用当前列表: {e}")
+                    urls = list(tasks)
+                for url in set(tasks) - set(urls):
+                    tasks.pop(url).cancel()
+                    targets.pop(url, None)
+                for url in urls:
+                    if url in tasks and tasks[url].done():
+                        # 意外退出的巡检任务重新启动，沿用上次的空房数
+                        error = None if tasks[url].cancelled() else tasks[url].exception()
+                        print(f"⚠️ [{targets[url].name}] 巡检任务已退出，重新启动: {error}")
+                        del tasks[url]
+                    if url not in tasks:
+                        target = targets.setdefault(url, WatchTarget(url))
+                        tasks[url] = asyncio.create_task(watch_target(target, check, semaphore, politeness))
+                print(f"--- 守护巡检中 ({len(tasks)} 个目标，并发 {WATCH_CONCURRENCY}) ---")
+                await asyncio.sleep(WATCH_RELOAD_MINUTES * 60)
+        finally:
+            for t in tasks.values():
+                t.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            if state["browser"] is not None:
+                await state["browser"].close()
+            checker.report()
+            ur_browser.report_route_stats()
+            ur_browser.report_wait_stats()
+
 async def start_monitor():
+    """单次巡检 (供 cron 调用)"""
+    urls = load_targets()
     async with async_playwright() as p:
         # 启动浏览器
         browser = await p.chromium.launch(headless=True) # 调试时可改 False
-        # 模拟真实的浏览器特征
-        context = await browser.new_context(
-            viewport={'width': 1280, 'height': 800},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        
-        print(f"--- 开启巡检 ({len(TARGET_URLS)}个目标) ---")
-        
-        # 为了防止被反爬封禁，建议不要跑太快
-        for url in TARGET_URLS:
-            status, msg = await check_with_browser(context, url)
+        context = await _new_context(browser)
+
+        print(f"--- 开启巡检 ({len(urls)}个目标) ---")
+
+        # 为了防止被反爬封禁，建议不要跑太快：两次检查之间至少间隔 3 秒 (快速检查 1 秒)
+        politeness = ur_browser.Politeness(ur_browser.politeness_interval(1.0 if WATCH_FAST else 3.0))
+        checker = FastChecker(context)
+        for url in urls:
+            await politeness.wait()
+            if WATCH_FAST:
+                count, msg = await checker.check(url)
+            else:
+                count, msg = await check_with_browser(context, url)
             print(f"[{url.split('/')[-1]}] {msg}")
-            await asyncio.sleep(3) # 增加间隔
-            
+
         await browser.close()
+        checker.report()
+        ur_browser.report_route_stats()
+        ur_browser.report_wait_stats()
 
 if __name__ == "__main__":
-    asyncio.run(start_monitor())
\ No newline at end of file
+    # 用法: python ur_watch.py          单次巡检后退出 (供 cron 调用，once 为同义写法)
+    #       python ur_watch.py daemon   常驻巡检
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        try:
+            asyncio.run(run_daemon())
+        except KeyboardInterrupt:
+            print("👋 巡检已停止")
+    else:
+        asyncio.run(start_monitor())